@@ -0,0 +1,64 @@
+from typing import *
+
+try:
+    # keeps a second process from writing the same history
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class HistoryLockedError(OSError):
+    pass
+
+
+def lock_history(path: str) -> Optional[IO]:
+    """Lock `path` for this process until the returned file is closed.
+
+    Raises HistoryLockedError if another process holds the lock. Returns
+    None where file locks are not available.
+    """
+    if fcntl is None:
+        return None
+
+    lock_file = open(path + ".lock", 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise HistoryLockedError(f"{path} is in use by another process")
+
+    return lock_file
+
+
+class BaseHistoryStore:
+
+    # whether rows are read back in pages instead of through `load`
+    paged = False
+
+    def __init__(self) -> None:
+        pass
+
+    def load(self) -> List[Tuple[str, int]]:
+        """Return every (word, count) pair in row order."""
+        pass
+
+    def record(self, word: str, count: Optional[int]):
+        """Persist the new count of `word`, or its removal if `count` is None."""
+        pass
+
+    def record_many(self, items: Iterable[Tuple[str, Optional[int]]]):
+        for word, count in items:
+            self.record(word, count)
+
+    def add_lookups(self, items: List[Tuple[str, int, int]]) -> List[int]:
+        """Persist (word, lookups added, new count in the model) `items`.
+
+        Returns the count of each word afterwards. A store shared with
+        other writers adds the lookups to its own counts, which may differ
+        from the model's.
+        """
+        self.record_many((word, count) for word, _, count in items)
+        return [count for _, _, count in items]
+
+    def close(self):
+        pass
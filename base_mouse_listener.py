@@ -2,7 +2,10 @@ from typing import *
 
 
 class BaseMouseListener:
-    def __init__(self, on_dbclick: Callable[[int, int], None], dbclick_gap=0.2) -> None:
+    """Calls `on_dbclick(x, y, clicked)` on double-clicks, `clicked` being
+    the time.perf_counter() of the second click."""
+
+    def __init__(self, on_dbclick: Callable[[int, int, float], None], dbclick_gap=0.2) -> None:
         self._on_dbclick = on_dbclick
         self._dbclick_gap = dbclick_gap
 
@@ -1,7 +1,11 @@
+from typing import *
+
+
 class BaseSelectionGrabber:
 
     def __init__(self) -> None:
         pass
 
-    def grab(self) -> str:
+    def grab(self, clicked: Optional[float] = None) -> str:
+        """The selected text, `clicked` is the time.perf_counter() of the double-click."""
         pass
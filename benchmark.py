@@ -0,0 +1,298 @@
+"""Benchmarks for the hot paths of selection_dict.
+
+Runs headless on Qt's offscreen platform with synthetic data:
+
+    python benchmark.py                   # run and compare with the baseline
+    python benchmark.py --save-baseline   # run and store the results as baseline
+    python benchmark.py --quick           # skip the 1M word fixtures
+
+Every result is a time in microseconds (lower is better). The run fails
+with exit code 1 when a result is slower than its baseline by more than
+`--threshold` (25% by default).
+"""
+from typing import *
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide2.QtCore import *
+from PySide2.QtWidgets import *
+from PySide2.QtGui import *
+
+import compact_dictionary
+import regex_profiler
+from local_dictionary import TsvDictionary
+from lookup_event_log import DAY, LookupEventLog
+from table_item_delegate import TableItemDelegate
+from url_resolver import UrlResolver
+from word_history import WordHistory
+from word_search_proxy_model import WordSearchProxyModel
+
+
+def _timeit(func: Callable[[], Any], repeat: int, rounds=3) -> float:
+    """Return the best average time (in microseconds) of a single call."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat * 1e6)
+    return best
+
+
+def _make_history(size: int) -> WordHistory:
+    model = WordHistory()
+    model.set_rows((f"word{i}", i % 7 + 1) for i in range(size))
+    return model
+
+
+def bench_word_history(sizes: Iterable[int]) -> Dict[str, float]:
+    results = {}
+
+    for size in sizes:
+        model = _make_history(size)
+
+        counter = iter(range(size, size * 2))
+        results[f"history.add_new.{size}"] = _timeit(
+            lambda: model.add_word(f"word{next(counter)}"), 1000, rounds=1)
+        results[f"history.add_seen.{size}"] = _timeit(
+            lambda: model.add_word("word0"), 1000)
+
+        # a table repaint asks every visible cell for its display and background data
+        row = size // 2
+        indexes = [model.index(row, col) for col in range(model.columnCount())]
+
+        def paint_row():
+            for index in indexes:
+                model.data(index, Qt.DisplayRole)
+                model.data(index, Qt.BackgroundRole)
+
+        results[f"history.data_row.{size}"] = _timeit(paint_row, 1000)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.txt")
+            results[f"history.save_data.{size}"] = _timeit(
+                lambda: model.save_data(path), 1, rounds=2)
+            results[f"history.load_data.{size}"] = _timeit(
+                lambda: WordHistory().load_data(path), 1, rounds=2)
+
+    return results
+
+
+def bench_search(sizes: Iterable[int]) -> Dict[str, float]:
+    results = {}
+
+    for size in sizes:
+        model = _make_history(size)
+        proxy = WordSearchProxyModel(model)
+        # build the index outside the measurement
+        model.build_index()
+        while not model.is_indexed():
+            QApplication.processEvents()
+            time.sleep(0.01)
+
+        # one keystroke at a time, as typed into the search box
+        queries = ["w", "wo", "wor", "word", "word1", "word12", "word123"]
+        counter = iter(range(10 ** 9))
+
+        def keystroke():
+            proxy.set_query(queries[next(counter) % len(queries)])
+
+        results[f"search.keystroke.{size}"] = _timeit(keystroke, len(queries) * 2, rounds=1)
+
+    return results
+
+
+def bench_url_resolver(pattern_counts: Iterable[int]) -> Dict[str, float]:
+    results = {}
+
+    for n in pattern_counts:
+        # language specific patterns that do not match, then a catch all
+        source_data = [[f"[\\u{0x3040 + i:04x}]+", f"https://example.com/{i}/%s", "web"]
+                       for i in range(n - 1)]
+        source_data.append(["", "https://jisho.org/search/%s", "web"])
+        resolver = UrlResolver(source_data)
+        # as once the patterns are timed after loading
+        patterns = [source[0] for source in source_data]
+        resolver.costs.update(zip(patterns, regex_profiler.profile(patterns, timeout=10.0)))
+        resolver.rebuild()
+
+        def loop():
+            for pattern, url, _ in source_data:
+                if re.match(pattern, "selection") is not None:
+                    return url % "selection"
+
+        results[f"resolver.re_match_loop.{n}"] = _timeit(loop, 2000)
+        results[f"resolver.resolve.{n}"] = _timeit(
+            lambda: resolver.resolve("selection"), 2000)
+        # per word, as an export resolves the whole history
+        words = [f"selection{i}" for i in range(1000)]
+        results[f"resolver.resolve_batch.{n}"] = _timeit(
+            lambda: resolver.resolve_batch(words), 5) / len(words)
+
+    return results
+
+
+def bench_local_dictionary(sizes: Iterable[int]) -> Dict[str, float]:
+    results = {}
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            tsv_path = os.path.join(tmp, "words.tsv")
+            sdict_path = os.path.join(tmp, "words.sdict")
+
+            entries = [(f"word{i}", f"<b>word{i}</b> definition number {i}") for i in range(size)]
+            with open(tsv_path, 'w', encoding='utf-8') as f:
+                f.writelines(f"{headword}\t{definition}\n" for headword, definition in entries)
+            compact_dictionary.build(entries, sdict_path)
+
+            results[f"local_dict.tsv_open.{size}"] = _timeit(
+                lambda: TsvDictionary(tsv_path), 1, rounds=2)
+            results[f"local_dict.sdict_open.{size}"] = _timeit(
+                lambda: compact_dictionary.CompactDictionary(sdict_path), 10)
+
+            # lookups spread over the file, so most of them decompress a block
+            dictionary = compact_dictionary.CompactDictionary(sdict_path)
+            counter = iter(range(10 ** 9))
+            results[f"local_dict.sdict_lookup.{size}"] = _timeit(
+                lambda: dictionary.lookup(f"word{next(counter) * 7919 % size}"), 1000)
+
+    return results
+
+
+def bench_event_log(sizes: Iterable[int]) -> Dict[str, float]:
+    results = {}
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            event_log = LookupEventLog(os.path.join(tmp, "lookups"))
+            now = time.time()
+            # a year of lookups over a vocabulary of size / 20 words
+            for i in range(size):
+                event_log.record(f"word{i * 7919 % (size // 20 + 1)}", "example.com",
+                                 now - (i * 104729 % (365 * DAY)))
+
+            results[f"event_log.per_day.{size}"] = _timeit(
+                lambda: event_log.per_day_counts(7, now=now), 3)
+            results[f"event_log.top_week.{size}"] = _timeit(
+                lambda: event_log.top(10, since=now - 7 * DAY, now=now), 3)
+            results[f"event_log.top_recency.{size}"] = _timeit(
+                lambda: event_log.top(10, half_life_days=7, now=now), 3)
+            event_log.close()
+
+    return results
+
+
+def bench_delegate(size: int) -> Dict[str, float]:
+    model = _make_history(size)
+    view = QTableView()
+    view.setModel(model)
+    view.setItemDelegate(TableItemDelegate(None, QMenu()))
+    view.viewport().setMouseTracking(True)
+    view.resize(400, 800)
+    view.show()
+    QApplication.processEvents()
+
+    scrollbar = view.verticalScrollBar()
+    steps = iter(range(10 ** 9))
+
+    def scroll_frame():
+        scrollbar.setValue(next(steps) * 7 % scrollbar.maximum())
+        view.viewport().repaint()
+
+    viewport = view.viewport()
+    positions = [QPoint(300, y) for y in range(10, 790, 13)]
+    moves = iter(range(10 ** 9))
+
+    def hover_frame():
+        pos = positions[next(moves) % len(positions)]
+        QApplication.sendEvent(viewport, QMouseEvent(
+            QEvent.MouseMove, pos, Qt.NoButton, Qt.NoButton, Qt.NoModifier))
+        viewport.repaint()
+
+    results = {
+        f"delegate.scroll_frame.{size}": _timeit(scroll_frame, 100),
+        f"delegate.hover_frame.{size}": _timeit(hover_frame, 100)
+    }
+
+    view.close()
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Print results next to the baseline and return the names that regressed."""
+    regressions = []
+
+    print(f"{'benchmark':<36} {'us':>12} {'baseline':>12} {'change':>8}")
+    for name, value in results.items():
+        base = baseline.get(name)
+
+        if base is None:
+            print(f"{name:<36} {value:>12.2f} {'-':>12} {'-':>8}")
+            continue
+
+        change = value / base - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<36} {value:>12.2f} {base:>12.2f} {change:>+8.0%}{flag}")
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", default="benchmark_baseline.json",
+                        help="baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown before a result counts as a regression")
+    parser.add_argument("--quick", action="store_true",
+                        help="skip the largest fixtures")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    app.setStyle("Fusion")
+
+    sizes = [1_000, 10_000, 100_000]
+    if not args.quick:
+        sizes.append(1_000_000)
+
+    results = {}
+    results.update(bench_word_history(sizes))
+    results.update(bench_search(sizes))
+    results.update(bench_url_resolver([1, 10, 50, 200]))
+    results.update(bench_local_dictionary(sizes))
+    results.update(bench_event_log(sizes))
+    results.update(bench_delegate(100_000))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+
+    if len(regressions) > 0:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Compact dictionary files (.sdict) that are looked up through mmap.
+
+Opening one costs a header read, lookups binary search the sorted keys
+straight from the mapped file and only decompress the block holding the
+definition, so a large dictionary takes almost no resident memory.
+
+Build one from a .tsv dictionary (see local_dictionary):
+
+    python compact_dictionary.py words.tsv words.sdict
+
+Layout, all integers little endian:
+
+    header      MAGIC, then entry count, block count and the offsets of
+                the sections below (7 x uint64)
+    keys        case folded headwords, utf-8, sorted, concatenated
+    key table   (count + 1) x uint64 start offsets into the key section
+    entries     count x (block uint32, offset uint32, length uint32), where
+                the definition is within the decompressed block
+    block table (block count + 1) x uint64 start offsets of the blocks
+    blocks      zlib compressed runs of utf-8 definitions
+"""
+from typing import *
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+from threading import Lock
+
+MAGIC = b"SDICT\x00\x01\x00"
+HEADER = struct.Struct("<8s7Q")
+OFFSET = struct.Struct("<Q")
+ENTRY = struct.Struct("<3I")
+
+# uncompressed bytes per block, a lookup decompresses one block
+BLOCK_SIZE = 16 * 1024
+
+
+def fold(word: str) -> str:
+    return word.strip().casefold()
+
+
+def build(entries: Iterable[Tuple[str, str]], path: str) -> int:
+    """Write `entries` of (headword, definition) to `path`, return the entry count.
+
+    Definitions of the same headword are joined with <hr>, as in a .tsv file.
+    """
+    definitions: Dict[bytes, str] = {}
+    for headword, definition in entries:
+        key = fold(headword).encode('utf-8')
+        if key in definitions:
+            definitions[key] += "<hr>" + definition
+        else:
+            definitions[key] = definition
+
+    # utf-8 byte order is code point order, the reader compares bytes
+    keys = sorted(definitions)
+
+    key_offsets = [0]
+    for key in keys:
+        key_offsets.append(key_offsets[-1] + len(key))
+
+    entry_table = bytearray()
+    blocks: List[bytes] = []
+    block = bytearray()
+
+    for key in keys:
+        data = definitions.pop(key).encode('utf-8')
+
+        if len(block) > 0 and len(block) + len(data) > BLOCK_SIZE:
+            blocks.append(zlib.compress(bytes(block), 6))
+            block = bytearray()
+
+        entry_table += ENTRY.pack(len(blocks), len(block), len(data))
+        block += data
+
+    if len(block) > 0:
+        blocks.append(zlib.compress(bytes(block), 6))
+
+    block_offsets = [0]
+    for data in blocks:
+        block_offsets.append(block_offsets[-1] + len(data))
+
+    keys_start = HEADER.size
+    key_table_start = keys_start + key_offsets[-1]
+    entries_start = key_table_start + len(key_offsets) * OFFSET.size
+    block_table_start = entries_start + len(entry_table)
+    blocks_start = block_table_start + len(block_offsets) * OFFSET.size
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(keys), len(blocks), keys_start, key_table_start,
+                            entries_start, block_table_start, blocks_start))
+        for key in keys:
+            f.write(key)
+        f.write(struct.pack(f"<{len(key_offsets)}Q", *key_offsets))
+        f.write(entry_table)
+        f.write(struct.pack(f"<{len(block_offsets)}Q", *block_offsets))
+        for data in blocks:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+    return len(keys)
+
+
+class CompactDictionary:
+
+    # decompressed blocks kept around for neighbouring lookups
+    CACHED_BLOCKS = 8
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        # the map keeps its own handle on the file
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < HEADER.size or self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a compact dictionary")
+
+        (_, self._count, self._block_count, self._keys_start, self._key_table_start,
+         self._entries_start, self._block_table_start, self._blocks_start) = HEADER.unpack_from(self._map)
+
+        self._blocks: OrderedDict[int, bytes] = OrderedDict()
+        self._blocks_lock = Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        """Unmap the file, lookups fail with ValueError afterwards."""
+        self._map.close()
+
+    def _key_at(self, i: int) -> bytes:
+        start, end = struct.unpack_from("<2Q", self._map, self._key_table_start + i * OFFSET.size)
+        return self._map[self._keys_start + start:self._keys_start + end]
+
+    def _find(self, key: bytes) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _block(self, i: int) -> bytes:
+        with self._blocks_lock:
+            block = self._blocks.get(i)
+            if block is not None:
+                self._blocks.move_to_end(i)
+                return block
+
+        start, end = struct.unpack_from("<2Q", self._map, self._block_table_start + i * OFFSET.size)
+        with memoryview(self._map) as view:
+            block = zlib.decompress(view[self._blocks_start + start:self._blocks_start + end])
+
+        with self._blocks_lock:
+            self._blocks[i] = block
+            if len(self._blocks) > self.CACHED_BLOCKS:
+                self._blocks.popitem(last=False)
+
+        return block
+
+    def lookup(self, word: str) -> Optional[str]:
+        key = fold(word).encode('utf-8')
+
+        i = self._find(key)
+        if i == self._count or self._key_at(i) != key:
+            return None
+
+        block, offset, length = ENTRY.unpack_from(self._map, self._entries_start + i * ENTRY.size)
+        return self._block(block)[offset:offset + length].decode('utf-8')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build a compact .sdict dictionary from a .tsv dictionary.")
+    parser.add_argument("source", help="tab separated headword and definition per line")
+    parser.add_argument("output", help="the .sdict file to write")
+    args = parser.parse_args()
+
+    def read_entries():
+        with open(args.source, 'r', encoding='utf-8') as f:
+            for line in f:
+                headword, sep, definition = line.rstrip("\n").partition("\t")
+                if len(sep) > 0:
+                    yield headword, definition
+
+    count = build(read_entries(), args.output)
+    print(f"{count} entries written to {args.output} ({os.path.getsize(args.output)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
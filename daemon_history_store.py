@@ -0,0 +1,36 @@
+from typing import *
+
+from base_history_store import BaseHistoryStore
+from lookup_client import LookupClient, LookupDaemonError
+
+
+class DaemonHistoryStore(BaseHistoryStore):
+    """History kept by a running lookup_daemon, shared with its other clients."""
+
+    def __init__(self, client: LookupClient) -> None:
+        super().__init__()
+        self._client = client
+
+    def load(self) -> List[Tuple[str, int]]:
+        return self._client.history()
+
+    def record(self, word: str, count: Optional[int]):
+        self.record_many([(word, count)])
+
+    def add_lookups(self, items: List[Tuple[str, int, int]]) -> List[int]:
+        # increments, an absolute count would undo the other clients' lookups
+        try:
+            return self._client.record_batch([word for word, _, _ in items],
+                                             [added for _, added, _ in items])
+        except (OSError, LookupDaemonError) as e:
+            print(f"lookup daemon unreachable, lookups not recorded: {e}")
+            return [count for _, _, count in items]
+
+    def record_many(self, items: Iterable[Tuple[str, Optional[int]]]):
+        try:
+            self._client.store(items)
+        except OSError as e:
+            print(f"lookup daemon unreachable, change not recorded: {e}")
+
+    def close(self):
+        self._client.close()
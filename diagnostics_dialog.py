@@ -0,0 +1,66 @@
+from typing import *
+from PySide2.QtCore import *
+from PySide2.QtWidgets import *
+from PySide2.QtGui import *
+
+from lookup_tracer import tracer
+
+
+class DiagnosticsDialog(QDialog):
+
+    COLUMNS = ["count", "p50", "p90", "p99", "max"]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.setWindowTitle("Lookup Diagnostics")
+
+        self.main_layout = QVBoxLayout()
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(
+            [self.COLUMNS[0]] + [f"{c} (ms)" for c in self.COLUMNS[1:]])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.main_layout.addWidget(self.table)
+
+        self.buttons_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.buttons_layout.addWidget(self.refresh_button)
+        self.export_button = QPushButton("Export JSON...")
+        self.export_button.clicked.connect(self._handle_export_btn)
+        self.buttons_layout.addWidget(self.export_button)
+        self.main_layout.addLayout(self.buttons_layout)
+
+        self.setLayout(self.main_layout)
+        self.resize(520, 360)
+
+        self.refresh()
+
+    def refresh(self):
+        data = tracer.to_dict()
+        rows = [(f"stage: {name}", summary) for name, summary in data["stages"].items()]
+        rows += [(f"source: {name}", summary) for name, summary in data["sources"].items()]
+
+        self.table.setRowCount(len(rows))
+        self.table.setVerticalHeaderLabels([name for name, _ in rows])
+
+        for row, (_, summary) in enumerate(rows):
+            for col, key in enumerate(self.COLUMNS):
+                value = summary.get(key)
+                if value is None:
+                    text = "-"
+                elif key == "count":
+                    text = str(value)
+                else:
+                    text = f"{value:.1f}"
+                self.table.setItem(row, col, QTableWidgetItem(text))
+
+    def _handle_export_btn(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Diagnostics", "lookup_latency.json", "JSON (*.json)")
+
+        if len(path) == 0:
+            return
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(tracer.to_json())
@@ -1,24 +1,97 @@
 from typing import *
 import json
+import os
 import re
+from threading import Thread
 from PySide2.QtCore import *
 from PySide2.QtWidgets import *
 from PySide2.QtGui import *
 
+import regex_profiler
+from url_resolver import LOCAL, WEB
+
 
 class DictSourceModelSignals(QObject):
     rejected = Signal(str)
+    warned = Signal(str)
+    changed = Signal()
+    # patterns and their costs, or None if they could not be timed
+    measured = Signal(list, object)
 
 
 class DictSourceModel(QAbstractTableModel):
 
-    def __init__(self, data: List[List[str]]) -> None:
+    # the read only column with the measured cost of each pattern
+    COST_COLUMN = 3
+
+    def __init__(self, data: List[List[str]], quarantined: Optional[Set[str]] = None,
+                 costs: Optional[Dict[str, Optional[float]]] = None) -> None:
         super().__init__()
         self.source_data = data
+        self.quarantined = quarantined if quarantined is not None else set()
         self.signals = DictSourceModelSignals()
+        # queued, profiling runs on a worker thread
+        self.signals.measured.connect(self._handle_measured)
+
+        # pattern -> worst time per match over regex_profiler.CORPUS, None if it timed out
+        self.costs = costs if costs is not None else {}
+        # patterns being timed
+        self._measuring: Set[str] = set()
+        # id of an edited source -> the source and its new pattern, shown
+        # but kept out of source_data until the pattern is timed
+        self._pending: Dict[int, Tuple[List[str], str]] = {}
+
+        # takes a second or so, the editor shows up right away
+        self._measure([source[0] for source in data if source[0] not in self.costs])
+
+    def _measure(self, patterns: List[str]):
+        patterns = [pattern for pattern in dict.fromkeys(patterns)
+                    if pattern not in self._measuring]
+        if len(patterns) == 0:
+            return
+        self._measuring.update(patterns)
+        Thread(target=self._run_profile, args=(patterns,), daemon=True).start()
+
+    def _run_profile(self, patterns: List[str]):
+        try:
+            costs = regex_profiler.profile(patterns)
+        except (OSError, ValueError) as e:
+            print(f"cannot time the source patterns: {e}")
+            costs = None
+        self.signals.measured.emit(patterns, costs)
+
+    def _handle_measured(self, patterns: List[str], costs: Optional[List[Optional[float]]]):
+        self._measuring.difference_update(patterns)
+        if costs is not None:
+            self.costs.update(zip(patterns, costs))
+
+        for key, (source, pattern) in list(self._pending.items()):
+            # the message boxes below run an event loop that may settle it first
+            if pattern in self._measuring or self._pending.pop(key, None) is None:
+                continue
+
+            if pattern in self.costs:
+                cost = self.costs[pattern]
+                if cost is None or cost > regex_profiler.REJECT_SECS:
+                    self.signals.rejected.emit(
+                        f'"{pattern}" takes too long to match some words and would stall lookups. '
+                        f'Nested repetition like (a+)+ is the usual cause.')
+                    continue
+
+                if cost > regex_profiler.WARN_SECS:
+                    self.signals.warned.emit(
+                        f'"{pattern}" takes up to {cost * 1e6:.0f} µs to match a word, '
+                        f'which slows down every lookup.')
+
+            source[0] = pattern
+            self.signals.changed.emit()
+
+        if len(self.source_data) > 0:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self.source_data) - 1, self.COST_COLUMN))
 
     def columnCount(self, parent: QModelIndex = ...) -> int:
-        return 2
+        return 4
 
     def rowCount(self, parent: QModelIndex = ...) -> int:
         return len(self.source_data)
@@ -28,13 +101,53 @@ class DictSourceModel(QAbstractTableModel):
         row = index.row()
         col = index.column()
 
+        if col == self.COST_COLUMN:
+            return self._cost_data(self._pattern_of(row), role)
+
         if role == Qt.DisplayRole or role == Qt.EditRole:
+            if col == 0:
+                return self._pattern_of(row)
             return self.source_data[row][col]
 
+    def _pattern_of(self, row: int) -> str:
+        source = self.source_data[row]
+        pending = self._pending.get(id(source))
+        return pending[1] if pending is not None else source[0]
+
+    def _cost_data(self, pattern: str, role: int) -> Any:
+        cost = self.costs.get(pattern)
+
+        if role == Qt.DisplayRole:
+            if pattern in self.quarantined:
+                return "disabled"
+            if pattern in self._measuring:
+                return "measuring…"
+            if pattern not in self.costs:
+                return "unknown"
+            if cost is None:
+                return "too slow"
+            return f"{cost * 1e6:.1f} µs"
+
+        elif role == Qt.ForegroundRole:
+            if pattern not in self.costs:
+                return None
+            if pattern in self.quarantined or cost is None or cost > regex_profiler.REJECT_SECS:
+                return QColor.fromRgb(235, 64, 52)
+            if cost > regex_profiler.WARN_SECS:
+                return QColor.fromRgb(235, 147, 52)
+
+        elif role == Qt.ToolTipRole:
+            if pattern in self.quarantined:
+                return "This pattern timed out during a lookup and is skipped until restart."
+            return "Slowest match over the test words."
+
     def removeRows(self, row: int, count: int, parent: QModelIndex = ...) -> bool:
         self.beginRemoveRows(QModelIndex(), row, (row + count - 1))
+        for source in self.source_data[row: (row + count)]:
+            self._pending.pop(id(source), None)
         del self.source_data[row: (row + count)]
         self.endRemoveRows()
+        self.signals.changed.emit()
         return True
 
     def headerData(self, section: int, orientation: Qt.Orientation, role: int = ...) -> Any:
@@ -43,11 +156,17 @@ class DictSourceModel(QAbstractTableModel):
             if section == 0:
                 return "pattern (re)"
             elif section == 1:
-                return "url"
+                return "url / file"
+            elif section == 2:
+                return "type"
+            elif section == self.COST_COLUMN:
+                return "cost"
 
         return super().headerData(section, orientation, role)
 
     def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        if index.column() == self.COST_COLUMN:
+            return super().flags(index)
         return super().flags(index) | Qt.ItemIsEditable
 
     def setData(self, index: QModelIndex, value: Any, role: int = ...) -> bool:
@@ -55,6 +174,9 @@ class DictSourceModel(QAbstractTableModel):
         row = index.row()
         col = index.column()
 
+        if col == self.COST_COLUMN:
+            return False
+
         if col == 0:
             try:
                 re.compile(value)
@@ -63,28 +185,85 @@ class DictSourceModel(QAbstractTableModel):
                     f'"{value}" is not a valid regular expression.')
                 return False
 
+            # shown until it is timed, and only then stored if it is fast enough
+            source = self.source_data[row]
+            if value == source[0]:
+                self._pending.pop(id(source), None)
+            else:
+                self._pending[id(source)] = (source, value)
+
+            if value not in self.costs and value not in self._measuring:
+                self._measure([value])
+            self.dataChanged.emit(index, self.index(row, self.COST_COLUMN))
+
+            if value not in self._measuring:
+                # timed before, settle it now
+                self._handle_measured([], None)
+            return True
+
+        elif col == 2 and value not in (WEB, LOCAL):
+            self.signals.rejected.emit(
+                f'"{value}" is not a source type, use "{WEB}" or "{LOCAL}".')
+            return False
+
+        # a local source points at a dictionary file
+        url, source_type = self.source_data[row][1:3]
+        if col == 1:
+            url = value
+        elif col == 2:
+            source_type = value
+
+        if col != 0 and source_type == LOCAL and not os.path.isfile(url):
+            self.signals.rejected.emit(
+                f'"{url}" is not a dictionary file.')
+            return False
+
         self.source_data[row][col] = value
-        self.dataChanged.emit(index, index)
+        self.dataChanged.emit(index, self.index(row, self.COST_COLUMN))
+        self.signals.changed.emit()
 
         return True
 
 
+class SourceTypeDelegate(QStyledItemDelegate):
+    """Edits the type column with a combo box."""
+
+    def createEditor(self, parent: QWidget, option: QStyleOptionViewItem, index: QModelIndex) -> QWidget:
+        editor = QComboBox(parent)
+        editor.addItems([WEB, LOCAL])
+        return editor
+
+    def setEditorData(self, editor: QComboBox, index: QModelIndex):
+        editor.setCurrentText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor: QComboBox, model: QAbstractItemModel, index: QModelIndex):
+        model.setData(index, editor.currentText(), Qt.EditRole)
+
+
 class DictionarySourceEditor(QDialog):
 
-    def __init__(self, data: List[List[str]]) -> None:
+    def __init__(self, data: List[List[str]], quarantined: Optional[Set[str]] = None,
+                 costs: Optional[Dict[str, Optional[float]]] = None) -> None:
         super().__init__()
 
         self.main_layout = QHBoxLayout()
 
         self.source_view = QTableView()
-        self.source_model = DictSourceModel(data)
+        self.source_model = DictSourceModel(data, quarantined, costs)
         self.source_model.signals.rejected.connect(self._show_error)
+        self.source_model.signals.warned.connect(self._show_warning)
         self.source_view.setModel(self.source_model)
+        self.source_type_delegate = SourceTypeDelegate()
+        self.source_view.setItemDelegateForColumn(2, self.source_type_delegate)
         self.main_layout.addWidget(self.source_view)
         self.source_view.horizontalHeader().setSectionResizeMode(
             0, QHeaderView.ResizeToContents)
         self.source_view.horizontalHeader().setSectionResizeMode(
             1, QHeaderView.ResizeToContents)
+        self.source_view.horizontalHeader().setSectionResizeMode(
+            2, QHeaderView.ResizeToContents)
+        self.source_view.horizontalHeader().setSectionResizeMode(
+            3, QHeaderView.ResizeToContents)
         self.source_view.setSelectionMode(
             QAbstractItemView.SingleSelection)
         self.source_view.setSelectionBehavior(
@@ -115,3 +294,10 @@ class DictionarySourceEditor(QDialog):
         dlg.setIcon(QMessageBox.Critical)
         dlg.setText(msg)
         dlg.exec_()
+
+    def _show_warning(self, msg: str):
+        dlg = QMessageBox(self)
+        dlg.setWindowTitle("Warning")
+        dlg.setIcon(QMessageBox.Warning)
+        dlg.setText(msg)
+        dlg.exec_()
@@ -1,21 +1,89 @@
+from typing import *
+from collections import OrderedDict
+import os
+import time
+
 from PySide2.QtCore import *
 from PySide2.QtWidgets import *
 from PySide2.QtGui import *
 from PySide2.QtWebEngineWidgets import *
 
+import local_dictionary
+from lookup_tracer import LookupTrace
+from page_cache import PageCache
+from process_memory import rss_of
+from source_health import SourceHealth
+
+# QWebEnginePage.setHtml refuses content larger than this
+MAX_HTML_BYTES = 2 * 1024 * 1024
+
+
+class DictWindowSignals(QObject):
+    cache_updated = Signal()
+    footprint_updated = Signal()
+
+
 class DictWindow(QMainWindow):
 
-    def __init__(self) -> None:
+    def __init__(self, page_cache_bytes=64 * 1024 * 1024, http_cache_bytes=128 * 1024 * 1024, max_views=4,
+                 freeze_secs=30, discard_secs=300, renderer_budget_bytes=0) -> None:
         super().__init__()
         self.setWindowFlag(Qt.Popup)
 
+        self.signals = DictWindowSignals()
+
         self.set_location(0, 0)
 
         self.main_layout = QVBoxLayout()
         self.main_layout.setContentsMargins(0, 0, 0, 0)
 
-        self.web_view = QWebEngineView()
-        self.main_layout.addWidget(self.web_view)
+        # persistent profile so the http cache and cookies outlive the app
+        cache_dir = os.path.abspath("cache")
+        self.profile = QWebEngineProfile("selection_dict", self)
+        self.profile.setCachePath(os.path.join(cache_dir, "http"))
+        self.profile.setPersistentStoragePath(
+            os.path.join(cache_dir, "storage"))
+        self.profile.setHttpCacheType(QWebEngineProfile.DiskHttpCache)
+        self.profile.setHttpCacheMaximumSize(http_cache_bytes)
+
+        self.page_cache = PageCache(
+            os.path.join(cache_dir, "pages"), page_cache_bytes)
+
+        # One view per dictionary origin, least recently used first. A view
+        # stays on its site between popups so its renderer process is
+        # already running and switching sources is a widget swap.
+        self.max_views = max_views
+        self._views: OrderedDict[str, QWebEngineView] = OrderedDict()
+        # url each view shows (or is loading)
+        self._view_urls: Dict[QWebEngineView, str] = {}
+        # url whose network load should be stored once it finishes
+        self._pending_urls: Dict[QWebEngineView, str] = {}
+        # when each pending network load started
+        self._load_started: Dict[QWebEngineView, float] = {}
+
+        # views racing to show the current lookup, see set_urls
+        self._hedged: List[QWebEngineView] = []
+        # trace of the lookup on screen, marked once its page is rendered
+        self._trace: Optional[LookupTrace] = None
+        self.source_health = SourceHealth()
+
+        # Views out of sight are frozen after `freeze_secs` (no scripts or
+        # timers run) and discarded after `discard_secs` (the renderer
+        # drops the page and reloads it when it is shown again). Beyond a
+        # total renderer RSS of `renderer_budget_bytes` (0 for no limit)
+        # hidden views are discarded early, least recently used first.
+        self.freeze_secs = freeze_secs
+        self.discard_secs = discard_secs
+        self.renderer_budget_bytes = renderer_budget_bytes
+        self._last_used: Dict[QWebEngineView, float] = {}
+
+        self._lifecycle_timer = QTimer(self)
+        self._lifecycle_timer.setInterval(5000)
+        self._lifecycle_timer.timeout.connect(self._manage_memory)
+        self._lifecycle_timer.start()
+
+        self.view_stack = QStackedWidget()
+        self.main_layout.addWidget(self.view_stack)
         self.main_widget = QWidget()
         self.main_widget.setLayout(self.main_layout)
         self.setCentralWidget(self.main_widget)
@@ -28,12 +96,274 @@ class DictWindow(QMainWindow):
         with open("loading.html", 'r', encoding='utf-8') as f:
             self.loading_html = f.read()
 
-        self.web_view.setHtml(self.loading_html)
-
         self._rounded_corners()
 
-    def set_url(self, url: str):
-        self.web_view.load(QUrl(url))
+    @staticmethod
+    def _origin(url: str) -> str:
+        qurl = QUrl(url)
+        return f"{qurl.scheme()}://{qurl.authority()}"
+
+    def _get_view(self, origin: str) -> QWebEngineView:
+        view = self._views.get(origin)
+
+        if view is not None:
+            self._views.move_to_end(origin)
+            self._wake(view)
+            return view
+
+        # drop the least recently used view that is not on screen
+        if len(self._views) >= self.max_views:
+            for old_origin, old_view in self._views.items():
+                if old_view is not self.view_stack.currentWidget():
+                    self._remove_view(old_origin)
+                    break
+
+        view = QWebEngineView()
+        view.setPage(QWebEnginePage(self.profile, view))
+        view.loadFinished.connect(
+            lambda ok: self._handle_load_finished(view, ok))
+        view.setHtml(self.loading_html)
+        self.view_stack.addWidget(view)
+        self._views[origin] = view
+        self._last_used[view] = time.monotonic()
+
+        return view
+
+    def _remove_view(self, origin: str):
+        view = self._views.pop(origin)
+        self._view_urls.pop(view, None)
+        self._pending_urls.pop(view, None)
+        self._load_started.pop(view, None)
+        self._last_used.pop(view, None)
+        if view in self._hedged:
+            self._hedged.remove(view)
+        self.view_stack.removeWidget(view)
+        view.deleteLater()
+
+    def _wake(self, view: QWebEngineView):
+        self._last_used[view] = time.monotonic()
+        # a discarded page reloads its last url here
+        if view.page().lifecycleState() != QWebEnginePage.LifecycleState.Active:
+            view.page().setLifecycleState(QWebEnginePage.LifecycleState.Active)
+
+    def _hidden_views(self) -> List[QWebEngineView]:
+        """Views not on screen and not loading, least recently used first."""
+        shown = self.view_stack.currentWidget() if self.isVisible() else None
+        views = [view for view in self._views.values()
+                 if view is not shown and view not in self._pending_urls]
+        return sorted(views, key=lambda view: self._last_used.get(view, 0))
+
+    def _manage_memory(self):
+        now = time.monotonic()
+        hidden = self._hidden_views()
+
+        for view in hidden:
+            page = view.page()
+            idle = now - self._last_used.get(view, now)
+
+            if idle >= self.discard_secs:
+                if page.lifecycleState() != QWebEnginePage.LifecycleState.Discarded:
+                    page.setLifecycleState(QWebEnginePage.LifecycleState.Discarded)
+            elif idle >= self.freeze_secs:
+                if page.lifecycleState() == QWebEnginePage.LifecycleState.Active:
+                    page.setLifecycleState(QWebEnginePage.LifecycleState.Frozen)
+
+        if self.renderer_budget_bytes > 0:
+            self._enforce_budget(hidden)
+
+        self.signals.footprint_updated.emit()
+
+    def _enforce_budget(self, hidden: List[QWebEngineView]):
+        # several pages may share a renderer process
+        pids: Dict[int, List[QWebEngineView]] = {}
+        for view in self._views.values():
+            if view.page().lifecycleState() != QWebEnginePage.LifecycleState.Discarded:
+                pids.setdefault(view.page().renderProcessPid(), []).append(view)
+
+        rss = {pid: rss_of(pid) or 0 for pid in pids if pid > 0}
+        total = sum(rss.values())
+
+        for view in hidden:
+            if total <= self.renderer_budget_bytes:
+                break
+            if view.page().lifecycleState() == QWebEnginePage.LifecycleState.Discarded:
+                continue
+
+            pid = view.page().renderProcessPid()
+            view.page().setLifecycleState(QWebEnginePage.LifecycleState.Discarded)
+
+            # the process only goes away with the last page it renders
+            sharing = pids.get(pid, [])
+            if view in sharing:
+                sharing.remove(view)
+            if len(sharing) == 0:
+                total -= rss.pop(pid, 0)
+
+    def footprint(self) -> Dict[str, Any]:
+        """Resident memory of the app and its renderers in bytes, None where unknown."""
+        views = {}
+        renderers: Dict[int, Optional[int]] = {}
+
+        for origin, view in self._views.items():
+            state = view.page().lifecycleState()
+            pid = view.page().renderProcessPid()
+            if pid > 0 and pid not in renderers:
+                renderers[pid] = rss_of(pid)
+            views[origin] = {
+                "state": {QWebEnginePage.LifecycleState.Active: "active",
+                          QWebEnginePage.LifecycleState.Frozen: "frozen",
+                          QWebEnginePage.LifecycleState.Discarded: "discarded"}.get(state),
+                "pid": pid
+            }
+
+        known = [rss for rss in renderers.values() if rss is not None]
+
+        return {
+            "app": rss_of(os.getpid()),
+            "renderers": sum(known) if len(known) == len(renderers) else None,
+            "views": views
+        }
+
+    def warm_up(self, urls: Iterable[str]):
+        """Open a view on the site of each url ahead of the first lookup."""
+        for url in urls:
+            origin = self._origin(url)
+            if origin not in self._views and len(self._views) < self.max_views:
+                self._get_view(origin).load(QUrl(origin))
+
+    def set_url(self, url: str, trace: Optional[LookupTrace] = None):
+        self._cancel_hedge()
+        self._trace = trace
+
+        view = self._get_view(self._origin(url))
+        self.view_stack.setCurrentWidget(view)
+
+        # the page is already on screen
+        if self._view_urls.get(view) == url:
+            self._mark_rendered()
+            return
+
+        self._load(view, url)
+
+    def set_urls(self, urls: List[str], hedge_count=1, trace: Optional[LookupTrace] = None):
+        """Show whichever of the `hedge_count` fastest sites in `urls` loads first.
+
+        The other loads are stopped once one of them finishes.
+        """
+        # one candidate per site, as each site has a single view
+        candidates: Dict[str, str] = {}
+        for url in self.source_health.rank(urls, self._origin):
+            candidates.setdefault(self._origin(url), url)
+        ranked = list(candidates.values())[:max(1, min(hedge_count, self.max_views))]
+
+        # a page that shows without the network needs no race
+        for url in ranked:
+            view = self._views.get(self._origin(url))
+            if local_dictionary.is_local_url(url) or url in self.page_cache \
+                    or (view is not None and self._view_urls.get(view) == url):
+                self.set_url(url, trace)
+                return
+
+        # the fastest site is on screen until another one beats it
+        self.set_url(ranked[0], trace)
+
+        for url in ranked[1:]:
+            view = self._get_view(self._origin(url))
+            self._load(view, url)
+            self._hedged.append(view)
+
+        if len(self._hedged) > 0:
+            self._hedged.append(self.view_stack.currentWidget())
+
+    def _load(self, view: QWebEngineView, url: str):
+        self._view_urls[view] = url
+
+        if local_dictionary.is_local_url(url):
+            self._pending_urls.pop(view, None)
+            view.setHtml(local_dictionary.render(url))
+            self._mark_rendered()
+            return
+
+        html = self.page_cache.get(url)
+
+        if html is not None:
+            self._pending_urls.pop(view, None)
+            # the base url lets relative resources come from the http cache
+            view.setHtml(html, QUrl(url))
+        else:
+            self._pending_urls[view] = url
+            self._load_started[view] = time.monotonic()
+            view.load(QUrl(url))
+
+        self.signals.cache_updated.emit()
+
+    def _mark_rendered(self):
+        if self._trace is not None:
+            self._trace.mark("rendered")
+            self._trace = None
+
+    def _cancel_hedge(self, winner: Optional[QWebEngineView] = None):
+        hedged, self._hedged = self._hedged, []
+
+        for view in hedged:
+            if view is winner:
+                continue
+
+            url = self._pending_urls.pop(view, None)
+            started = self._load_started.pop(view, None)
+
+            # still loading, its page is not there to be shown next time
+            if url is not None:
+                if started is not None:
+                    self.source_health.record_at_least(
+                        self._origin(url), time.monotonic() - started)
+                self._view_urls.pop(view, None)
+                view.stop()
+
+    def _handle_load_finished(self, view: QWebEngineView, ok: bool):
+        # the loading page of a new view, cut short by the real load
+        if view.url().scheme() in ("", "about", "data"):
+            return
+
+        url = self._pending_urls.get(view)
+        started = self._load_started.pop(view, None)
+
+        if url is not None and started is not None:
+            if ok:
+                self.source_health.record(
+                    self._origin(url), time.monotonic() - started)
+            else:
+                self.source_health.record_failure(self._origin(url))
+
+        if view in self._hedged:
+            if ok:
+                self._cancel_hedge(winner=view)
+                self.view_stack.setCurrentWidget(view)
+            else:
+                self._hedged.remove(view)
+                # the rest are still loading, show one of those instead of the error page
+                if view is self.view_stack.currentWidget() and len(self._hedged) > 0:
+                    self.view_stack.setCurrentWidget(self._hedged[0])
+
+        if ok and view is self.view_stack.currentWidget():
+            self._mark_rendered()
+
+        url = self._pending_urls.pop(view, None)
+
+        if url is None:
+            return
+
+        if not ok:
+            # try again next time instead of keeping the error page
+            self._view_urls.pop(view, None)
+            return
+
+        def store(html: str):
+            if len(html.encode('utf-8')) <= MAX_HTML_BYTES:
+                self.page_cache.put(url, html)
+                self.signals.cache_updated.emit()
+
+        view.page().toHtml(store)
 
     def set_location(self, x: int, y: int):
         self.setGeometry(x, y, 300, 600)
@@ -51,4 +381,5 @@ class DictWindow(QMainWindow):
         self.setMask(bitmap)
 
     def closeEvent(self, a0: QCloseEvent) -> None:
-        self.web_view.setHtml(self.loading_html)
\ No newline at end of file
+        # views are kept on their pages so the next popup shows instantly
+        pass
\ No newline at end of file
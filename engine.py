@@ -1,61 +1,265 @@
+from typing import *
 import re
+import time
+from threading import Thread
 
 from PySide2.QtCore import *
 from PySide2.QtWidgets import *
 from PySide2.QtGui import *
-from PySide2.QtWebEngineWidgets import *
 
+import local_dictionary
+from base_history_store import BaseHistoryStore, HistoryLockedError
+from daemon_history_store import DaemonHistoryStore
+from input_process import InputProcess
+from journal_history_store import JournalHistoryStore
+from lookup_client import LookupClient, LookupDaemonError
+from lookup_daemon import is_running
+from lookup_event_log import LookupEventLog
+from lookup_tracer import LookupTrace, source_of, tracer
 from pynput_mouse_listener import PynputMouseListener
 from pynput_selection_grabber import PynputSelectionGrabber
-from url_resolver import UrlResolver
+from qt_selection_grabber import QtSelectionGrabber
+from sqlite_history_store import SqliteHistoryStore
+from url_resolver import LOCAL, UrlResolver
 from word_history import WordHistory
 
 
 class EngineSignals(QObject):
-    selected = Signal(str, int, int)
+    # url, x, y and the LookupTrace of the lookup
+    selected = Signal(str, int, int, object)
+    # every matching url, for hedged lookups
+    selected_many = Signal(list, int, int, object)
+    history_loaded = Signal()
+
+
+class _BackgroundCall(QObject):
+    """Runs `func` on a worker thread and hands its result to `on_done`
+    on the thread that created the call."""
+
+    _done = Signal(object)
+
+    def __init__(self, func: Callable[[], Any], on_done: Callable[[Any], None]) -> None:
+        super().__init__()
+        self._func = func
+        self._on_done = on_done
+        # queued, since the call lives in the creating thread
+        self._done.connect(self._deliver)
+
+    def start(self):
+        Thread(target=lambda: self._done.emit(
+            self._func()), daemon=True).start()
+
+    def _deliver(self, result):
+        self._on_done(result)
 
 
 class Engine:
 
-    def __init__(self) -> None:
+    def __init__(self, history_backend="journal", grab_deadline=0.3, hedge_sources=1, daemon_socket=None, input_process=False) -> None:
         self.signals = EngineSignals()
+        # lookups race this many matching sources, 1 turns hedging off
+        self.hedge_sources = hedge_sources
         self.word_history_model = WordHistory()
-        self._mouse_listener = PynputMouseListener(
-            on_dbclick=self._handle_mouse_dbclick)
-        self._selection_grabber = PynputSelectionGrabber()
+
+        # listening and grabbing in a child process keeps them off our GIL
+        self._input_process: Optional[InputProcess] = None
+        if input_process:
+            self._input_process = InputProcess(
+                on_selection=self._handle_process_selection, grab_deadline=grab_deadline)
+        else:
+            self._mouse_listener = PynputMouseListener(
+                on_dbclick=self._handle_mouse_dbclick)
+
+            # the PRIMARY selection needs no keystrokes, use it where there is one
+            if QtSelectionGrabber.is_available():
+                self._selection_grabber = QtSelectionGrabber(
+                    deadline=grab_deadline)
+            else:
+                self._selection_grabber = PynputSelectionGrabber(
+                    deadline=grab_deadline)
+
         self.filename = "history.txt"
 
+        # with a lookup daemon running, the history and lookups go through it
+        self._client: Optional[LookupClient] = None
+        if daemon_socket and is_running(daemon_socket):
+            self._use_daemon(daemon_socket)
+        else:
+            try:
+                self.history_store = self._open_history_store(history_backend)
+            except HistoryLockedError as e:
+                if daemon_socket and is_running(daemon_socket):
+                    # it took the history while we were starting
+                    self._use_daemon(daemon_socket)
+                else:
+                    print(f"{e}, lookups are not saved")
+                    self.history_store = self._open_history_store(history_backend, read_only=True)
+
         self.url_resolver = UrlResolver()
 
-        # load history file if there's one
+        # read on the loader thread, see load_history
+        self.event_log: Optional[LookupEventLog] = None
+        self._calls: Set[_BackgroundCall] = set()
+
+    def _use_daemon(self, daemon_socket: str):
+        self._client = LookupClient(daemon_socket)
+        self.history_store = DaemonHistoryStore(self._client)
+        print(f"using the lookup daemon on {daemon_socket}")
+
+    def _open_history_store(self, history_backend: str, read_only=False) -> BaseHistoryStore:
+        if history_backend != "sqlite":
+            return JournalHistoryStore(self.filename, read_only=read_only)
+
+        store = SqliteHistoryStore("history.sqlite3", read_only=read_only)
+
+        # first run with the sqlite backend, bring the csv history over
+        if not read_only and store.is_empty():
+            store.record_many(JournalHistoryStore(self.filename, read_only=True).load())
+
+        return store
+
+    def update_sources(self):
+        """Apply edits made to `url_resolver.source_data`."""
+        self.url_resolver.rebuild()
+        Thread(target=local_dictionary.preload, args=(self._local_paths(),), daemon=True).start()
+
+        if self._client is None:
+            self.url_resolver.save_data()
+            return
+
+        # the daemon times the patterns before it takes them, and saves them
+        sources = [list(source) for source in self.url_resolver.source_data]
+        self.run_in_background(lambda: self._send_sources(sources), self._handle_sources_sent)
+
+    def _send_sources(self, sources: List[List[str]]) -> Optional[Exception]:
         try:
-            self.load_history()
-        except FileNotFoundError:
-            pass
+            self._client.set_sources(sources)
+        except (OSError, LookupDaemonError) as e:
+            return e
+        return None
+
+    def _handle_sources_sent(self, error: Optional[Exception]):
+        if error is not None:
+            print(f"lookup daemon did not take the sources: {error}")
+            self.url_resolver.save_data()
+
+    def _resolve(self, word: str) -> Optional[str]:
+        if self._client is not None:
+            try:
+                return self._client.resolve(word)
+            except (OSError, LookupDaemonError) as e:
+                print(f"lookup daemon unreachable, resolving locally: {e}")
+        return self.url_resolver.resolve(word)
+
+    def _resolve_all(self, word: str) -> List[str]:
+        if self._client is not None:
+            try:
+                return self._client.resolve_all(word)
+            except (OSError, LookupDaemonError) as e:
+                print(f"lookup daemon unreachable, resolving locally: {e}")
+        return self.url_resolver.resolve_all(word)
 
     def start_listening(self):
-        self._mouse_listener.start(wait=False)
+        if self._input_process is not None:
+            self._input_process.start()
+        else:
+            self._mouse_listener.start(wait=False)
 
     def stop_listening(self):
-        self._mouse_listener.stop()
+        if self._input_process is not None:
+            self._input_process.stop()
+        else:
+            self._mouse_listener.stop()
 
     def save_history(self):
-        self.word_history_model.save_data(self.filename)
+        # every change is already in the journal, just release the file
+        self.history_store.close()
+        if self.event_log is not None:
+            self.event_log.close()
 
     def load_history(self):
-        self.word_history_model.load_data(self.filename)
+        """Read the history and the lookup event log on a worker thread,
+        `history_loaded` fires once they are in the model."""
+        # the model must only be touched from the gui thread
+        self.run_in_background(self._read_history, self._apply_history)
+
+    def run_in_background(self, func: Callable[[], Any], on_done: Callable[[Any], None]):
+        """Call `func` on a worker thread, then `on_done` with its result on this thread."""
+        def done(result):
+            self._calls.discard(call)
+            on_done(result)
+
+        # kept referenced until the result is delivered
+        call = _BackgroundCall(func, done)
+        self._calls.add(call)
+        call.start()
+
+    def _local_paths(self) -> List[str]:
+        return [path for _, path, source_type in self.url_resolver.source_data
+                if source_type == LOCAL]
+
+    def _read_history(self) -> Tuple[LookupEventLog, Optional[Dict[str, int]]]:
+        # listening starts once this is done, so no lookup parses a dictionary on the gui thread
+        local_dictionary.preload(self._local_paths())
+
+        # millions of lookups take a while to read
+        event_log = LookupEventLog("lookups")
 
-    def _handle_mouse_dbclick(self, x: int, y: int):
+        # a paged store is read lazily by the model itself
+        if self.history_store.paged:
+            return event_log, None
 
-        selection = self._selection_grabber.grab()
-        print(f"selection = {selection}")
+        # the search index is built once the search box is used
+        return event_log, dict(self.history_store.load())
 
+    def _apply_history(self, loaded):
+        event_log, history = loaded
+        self.event_log = event_log
+        self.word_history_model.set_event_log(event_log)
+        if history is not None:
+            self.word_history_model.set_rows(history.items())
+        self.word_history_model.set_store(self.history_store)
+        self.signals.history_loaded.emit()
+
+    def _handle_mouse_dbclick(self, x: int, y: int, clicked: float):
+        # traced from here, as clicks piling up behind a busy worker are coalesced
+        trace = tracer.begin(ago=time.perf_counter() - clicked)
+
+        selection = self._selection_grabber.grab(clicked)
+        trace.mark("grabbed")
+        latency = self._selection_grabber.latency.summary()
+        print(f"selection = {selection} (grab p50 {latency['p50']:.1f} ms)")
+
+        self._handle_selection(x, y, selection, trace)
+
+    def _handle_process_selection(self, x: int, y: int, selection: str, lag: float):
+        # the click was traced in the input process, pick it up from there
+        trace = tracer.begin(ago=lag)
+        trace.mark("grabbed")
+        latency = self._input_process.lag.summary()
+        print(f"selection = {selection} (input lag {lag * 1000:.1f} ms, "
+              f"p50 {latency['p50']:.1f} ms, restarts {self._input_process.restarts})")
+
+        self._handle_selection(x, y, selection, trace)
+
+    def _handle_selection(self, x: int, y: int, selection: str, trace: LookupTrace):
         if len(selection) == 0:
             return
 
         self.word_history_model.add_word(selection)
 
-        url = self.url_resolver.resolve(selection)
+        if self.hedge_sources > 1:
+            urls = self._resolve_all(selection)
+            trace.mark("resolved", urls[0] if len(urls) > 0 else None)
+            self.event_log.record(selection, source_of(urls[0]) if len(urls) > 0 else "")
+
+            if len(urls) > 0:
+                self.signals.selected_many.emit(urls, x, y, trace)
+            return
+
+        url = self._resolve(selection)
+        trace.mark("resolved", url)
+        self.event_log.record(selection, source_of(url) if url is not None else "")
 
         if url is not None:
-            self.signals.selected.emit(url, x, y)
+            self.signals.selected.emit(url, x, y, trace)
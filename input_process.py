@@ -0,0 +1,134 @@
+"""Mouse listening and selection grabbing in a child process.
+
+PynputMouseListener and PynputSelectionGrabber poll and sleep in Python
+threads, which compete with the GUI for the GIL. InputProcess runs both
+in a worker process instead and streams every double-clicked selection
+back over a pipe. A worker that dies is started again.
+"""
+from typing import *
+import multiprocessing
+import time
+import traceback
+from threading import Lock, Thread
+
+from latency_stats import LatencyStats
+from pynput_mouse_listener import PynputMouseListener
+from pynput_selection_grabber import PynputSelectionGrabber
+
+
+def _run_worker(conn, grab_deadline: float):
+    grabber = PynputSelectionGrabber(deadline=grab_deadline)
+
+    def handle_dbclick(x: int, y: int, clicked: float):
+        selection = grabber.grab(clicked)
+        # wall clock, as it is compared across processes
+        conn.send((x, y, selection, time.time() - (time.perf_counter() - clicked)))
+
+    listener = PynputMouseListener(on_dbclick=handle_dbclick)
+    listening = False
+
+    while True:
+        try:
+            command = conn.recv()
+        except EOFError:
+            # the gui process is gone
+            return
+
+        if command == "start" and not listening:
+            listener.start(wait=False)
+            listening = True
+        elif command == "stop" and listening:
+            listener.stop()
+            listening = False
+        elif command == "exit":
+            return
+
+
+class InputProcess:
+
+    # seconds to wait before starting a crashed worker again
+    RESTART_DELAY = 1.0
+
+    def __init__(self, on_selection: Callable[[int, int, str, float], None], grab_deadline=0.3) -> None:
+        """`on_selection(x, y, selection, lag)` is called on a reader thread,
+        `lag` is the time in seconds from the double-click to the call."""
+        self._on_selection = on_selection
+        self.grab_deadline = grab_deadline
+
+        # double-click to event in this process
+        self.lag = LatencyStats()
+        self.restarts = 0
+
+        # fork would copy the running Qt and pynput threads' state
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = Lock()
+        self._process = None
+        self._conn = None
+        self._listening = False
+        self._closed = False
+
+        self._spawn()
+        Thread(target=self._run_reader, daemon=True).start()
+
+    def _spawn(self):
+        conn, child_conn = self._context.Pipe()
+        # daemonic, so it is killed along with the gui process
+        process = self._context.Process(
+            target=_run_worker, args=(child_conn, self.grab_deadline), daemon=True)
+        process.start()
+        # only the child holds its end now, recv sees EOF once it dies
+        child_conn.close()
+
+        with self._lock:
+            self._process = process
+            self._conn = conn
+
+        if self._listening:
+            self._send("start")
+
+    def _send(self, command: str):
+        with self._lock:
+            try:
+                self._conn.send(command)
+            except OSError:
+                # the worker died, the reader starts a new one
+                pass
+
+    def start(self):
+        self._listening = True
+        self._send("start")
+
+    def stop(self):
+        self._listening = False
+        self._send("stop")
+
+    def close(self):
+        self._closed = True
+        self._send("exit")
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def _run_reader(self):
+        while not self._closed:
+            try:
+                x, y, selection, clicked = self._conn.recv()
+            except (EOFError, OSError):
+                if self._closed:
+                    return
+
+                self._process.join(timeout=1)
+                print(f"input process exited with code {self._process.exitcode}, restarting")
+                time.sleep(self.RESTART_DELAY)
+                self.restarts += 1
+                self._spawn()
+                continue
+
+            lag = max(0.0, time.time() - clicked)
+            self.lag.add(lag)
+
+            try:
+                self._on_selection(x, y, selection, lag)
+            except Exception:
+                # keep reading for the next click
+                traceback.print_exc()
@@ -0,0 +1,153 @@
+from typing import *
+import csv
+import os
+from threading import Lock, Thread
+
+from base_history_store import BaseHistoryStore, lock_history
+
+
+# the count of a removed word in the journal
+REMOVED = "-"
+
+
+class JournalHistoryStore(BaseHistoryStore):
+    """Snapshot CSV plus an append-only journal of changes.
+
+    Every journal line holds the absolute count of a word after a change
+    (REMOVED instead means the word was removed), so replaying a line
+    twice is harmless. Once the journal grows past `compact_threshold` bytes it is
+    rotated to `<path>.journal.old` and a background thread folds it into
+    the snapshot.
+
+    Only one process may write the journal, see lock_history. A read only
+    store just loads.
+    """
+
+    def __init__(self, path: str, compact_threshold=256 * 1024, read_only=False) -> None:
+        super().__init__()
+        self.path = path
+        self.read_only = read_only
+        # held while the store is open, raises HistoryLockedError if it is taken
+        self._lock_file = None if read_only else lock_history(path)
+        self.journal_path = path + ".journal"
+        self.old_journal_path = path + ".journal.old"
+        self.compact_threshold = compact_threshold
+
+        self._lock = Lock()
+        self._journal = None
+        self._writer = None
+        self._compactor: Optional[Thread] = None
+
+    def load(self) -> List[Tuple[str, int]]:
+        data = self._read(self.path, self.old_journal_path, self.journal_path)
+
+        # a previous compaction was interrupted, finish it
+        if not self.read_only and os.path.exists(self.old_journal_path):
+            self._start_compactor()
+
+        return list(data.items())
+
+    def record(self, word: str, count: Optional[int]):
+        self.record_many([(word, count)])
+
+    def record_many(self, items: Iterable[Tuple[str, Optional[int]]]):
+        if self.read_only:
+            return
+
+        with self._lock:
+            if self._journal is None:
+                self._open_journal()
+
+            self._writer.writerows(
+                (word, REMOVED if count is None else count) for word, count in items)
+            self._journal.flush()
+
+            if self._journal.tell() >= self.compact_threshold:
+                self._rotate()
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                self._writer = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _open_journal(self):
+        torn = False
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+
+        self._journal = open(self.journal_path, 'a',
+                             encoding='utf-8', newline='')
+        self._writer = csv.writer(self._journal)
+
+        # terminate a line torn by a crash so it is not glued to the next one
+        if torn:
+            self._journal.write("\r\n")
+
+    def _rotate(self):
+        # the last rotated journal has not been folded into the snapshot yet
+        if os.path.exists(self.old_journal_path):
+            return
+
+        self._journal.close()
+        os.replace(self.journal_path, self.old_journal_path)
+        self._open_journal()
+        self._start_compactor()
+
+    def _start_compactor(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+
+        self._compactor = Thread(target=self._compact, daemon=True)
+        self._compactor.start()
+
+    def _compact(self):
+        data = self._read(self.path, self.old_journal_path)
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(data.items())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        # safe to crash before this: replaying the old journal again is a no-op
+        os.remove(self.old_journal_path)
+
+    @staticmethod
+    def _read(snapshot_path: str, *journal_paths: str) -> Dict[str, int]:
+        data: Dict[str, int] = {}
+
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                for k, v in csv.reader(f):
+                    data[k] = int(v)
+
+        for journal_path in journal_paths:
+            if not os.path.exists(journal_path):
+                continue
+
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                for line in csv.reader(f):
+                    # skip a line torn by a crash mid-write
+                    if len(line) != 2:
+                        continue
+
+                    k, v = line
+                    if v == REMOVED:
+                        data.pop(k, None)
+                        continue
+
+                    # an empty count is a line torn right after the comma
+                    try:
+                        data[k] = int(v)
+                    except ValueError:
+                        pass
+
+        return data
@@ -0,0 +1,43 @@
+from typing import *
+from collections import deque
+from threading import Lock
+
+
+class LatencyStats:
+    """Rolling window of latency samples (in seconds) with percentiles."""
+
+    def __init__(self, window=1000) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = Lock()
+        self.count = 0
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+
+        if len(samples) == 0:
+            return None
+
+        return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+    def summary(self) -> Dict[str, Any]:
+        """Count plus p50/p90/p99/max of the window, in milliseconds."""
+        with self._lock:
+            samples = sorted(self._samples)
+
+        summary: Dict[str, Any] = {"count": self.count}
+
+        if len(samples) == 0:
+            return summary
+
+        for p in (50, 90, 99):
+            summary[f"p{p}"] = samples[min(int(len(samples) * p / 100),
+                                           len(samples) - 1)] * 1000
+        summary["max"] = samples[-1] * 1000
+
+        return summary
@@ -0,0 +1,143 @@
+"""Dictionaries stored in local files, looked up without any network.
+
+A local source in dict_sources.json has the type "local" and the path of
+a dictionary file in place of the url. The resolver turns a lookup into a
+`local:<path>#<word>` url, which DictWindow renders with `render`.
+
+Supported files:
+    .tsv    one "headword<TAB>definition" entry per line, the definition
+            may contain HTML and "\\n" for line breaks
+    .sdict  the compact, memory mapped form of a .tsv file, built with
+            compact_dictionary.py
+"""
+from typing import *
+import html
+import os
+from threading import Lock
+from urllib.parse import quote, unquote
+
+from compact_dictionary import CompactDictionary
+
+SCHEME = "local"
+
+
+def local_url(path: str, word: str) -> str:
+    return f"{SCHEME}:{quote(path)}#{quote(word)}"
+
+
+def is_local_url(url: str) -> bool:
+    return url.startswith(SCHEME + ":")
+
+
+def parse_local_url(url: str) -> Tuple[str, str]:
+    """Return the (dictionary path, word) of a local url."""
+    path, _, word = url[len(SCHEME) + 1:].partition("#")
+    return unquote(path), unquote(word)
+
+
+class TsvDictionary:
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._entries: Dict[str, str] = {}
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                headword, sep, definition = line.rstrip("\n").partition("\t")
+                if len(sep) == 0:
+                    continue
+
+                key = headword.strip().casefold()
+                if key in self._entries:
+                    self._entries[key] += "<hr>" + definition
+                else:
+                    self._entries[key] = definition
+
+    def lookup(self, word: str) -> Optional[str]:
+        return self._entries.get(word.strip().casefold())
+
+
+# path -> (mtime, dictionary), so each file is parsed once
+_opened: Dict[str, Tuple[float, Any]] = {}
+# path -> lock held while that file is parsed
+_opening: Dict[str, Lock] = {}
+_opened_lock = Lock()
+
+
+def open_dictionary(path: str):
+    mtime = os.path.getmtime(path)
+
+    with _opened_lock:
+        opened = _opened.get(path)
+        if opened is not None and opened[0] == mtime:
+            return opened[1]
+        opening = _opening.setdefault(path, Lock())
+
+    # parsed outside _opened_lock, so the other dictionaries stay usable
+    with opening:
+        with _opened_lock:
+            opened = _opened.get(path)
+            if opened is not None and opened[0] == mtime:
+                return opened[1]
+
+        if path.lower().endswith(".sdict"):
+            dictionary = CompactDictionary(path)
+        else:
+            dictionary = TsvDictionary(path)
+
+        with _opened_lock:
+            replaced = _opened.get(path)
+            _opened[path] = (mtime, dictionary)
+
+        # the file changed, let go of the old mapping
+        if replaced is not None and isinstance(replaced[1], CompactDictionary):
+            replaced[1].close()
+
+        return dictionary
+
+
+def preload(paths: Iterable[str]):
+    """Open the dictionaries at `paths` ahead of their first lookup, call
+    this off the GUI thread as a large .tsv file takes a while to parse."""
+    for path in paths:
+        try:
+            open_dictionary(path)
+        except (OSError, ValueError) as e:
+            # render shows the error once the source is looked up
+            print(f"cannot open dictionary {path}: {e}")
+
+
+def render(url: str) -> str:
+    """Return the HTML page showing the entry `url` points at."""
+    path, word = parse_local_url(url)
+
+    try:
+        definition = open_dictionary(path).lookup(word)
+    except OSError as e:
+        return _page(word, f"<p class=\"missing\">Cannot open {html.escape(path)}: {html.escape(e.strerror or str(e))}</p>")
+    except ValueError as e:
+        return _page(word, f"<p class=\"missing\">{html.escape(str(e))}</p>")
+
+    if definition is None:
+        return _page(word, "<p class=\"missing\">No entry found.</p>")
+
+    return _page(word, definition.replace("\\n", "<br>"))
+
+
+def _page(word: str, body: str) -> str:
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>{html.escape(word)}</title>
+    <style>
+        body {{ font-family: sans-serif; margin: 12px; }}
+        h1 {{ font-size: 1.4em; margin: 0 0 8px 0; }}
+        .missing {{ color: #888; }}
+    </style>
+</head>
+<body>
+    <h1>{html.escape(word)}</h1>
+    {body}
+</body>
+</html>"""
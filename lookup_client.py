@@ -0,0 +1,104 @@
+from typing import *
+import json
+import socket
+from threading import Lock
+
+from lookup_daemon import DEFAULT_SOCKET
+
+
+class LookupDaemonError(Exception):
+    pass
+
+
+class LookupClient:
+    """Connection to a running lookup_daemon, see there for the protocol."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=5.0) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+        self._lock = Lock()
+        self._socket: Optional[socket.socket] = None
+        self._file = None
+
+    def connect(self):
+        with self._lock:
+            self._connect()
+
+    def _connect(self):
+        if self._socket is not None:
+            return
+
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        try:
+            s.connect(self.socket_path)
+        except OSError:
+            s.close()
+            raise
+
+        self._socket = s
+        self._file = s.makefile('rwb')
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = None
+            self._file = None
+
+    def call(self, op: str, **args) -> dict:
+        """Send one request and return its response, raises OSError if the daemon is gone."""
+        request = json.dumps(dict(args, op=op)).encode('utf-8') + b"\n"
+
+        with self._lock:
+            self._connect()
+            try:
+                self._file.write(request)
+                self._file.flush()
+                line = self._file.readline()
+            except OSError:
+                self._close()
+                raise
+
+            if len(line) == 0:
+                self._close()
+                raise ConnectionResetError("the lookup daemon closed the connection")
+
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise LookupDaemonError(response.get("error"))
+        return response
+
+    def resolve(self, word: str) -> Optional[str]:
+        return self.call("resolve", word=word)["url"]
+
+    def resolve_batch(self, words: List[str]) -> List[Optional[str]]:
+        return self.call("resolve_batch", words=words)["urls"]
+
+    def resolve_all(self, word: str) -> List[str]:
+        return self.call("resolve_all", word=word)["urls"]
+
+    def record(self, word: str) -> int:
+        return self.call("record", word=word)["count"]
+
+    def record_batch(self, words: List[str], by: Optional[List[int]] = None) -> List[int]:
+        if by is None:
+            return self.call("record_batch", words=words)["counts"]
+        return self.call("record_batch", words=words, by=by)["counts"]
+
+    def history(self) -> List[Tuple[str, int]]:
+        return [tuple(item) for item in self.call("history")["items"]]
+
+    def top(self, n: int) -> List[str]:
+        return self.call("top", n=n)["words"]
+
+    def store(self, items: Iterable[Tuple[str, Optional[int]]]):
+        self.call("store", items=list(items))
+
+    def set_sources(self, sources: List[List[str]]):
+        self.call("set_sources", sources=sources)
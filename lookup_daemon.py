@@ -0,0 +1,213 @@
+"""Headless lookup service shared by the GUI, scripts and editor plugins.
+
+Owns the dictionary sources and the word history, without Qt, and serves
+them over a Unix domain socket:
+
+    python lookup_daemon.py [--socket selection_dict.sock] [--history-backend journal]
+
+The protocol is one JSON object per line in each direction. Every request
+has an "op", every response has "ok" and either the results or "error":
+
+    {"op": "resolve", "word": w}                -> {"url": url or null}
+    {"op": "resolve_batch", "words": [w, ...]}  -> {"urls": [...]}
+    {"op": "resolve_all", "word": w}            -> {"urls": [...]}
+    {"op": "record", "word": w}                 -> {"count": n}
+    {"op": "record_batch", "words": [w, ...]}   -> {"counts": [...]}
+    {"op": "record_batch", "words": [w, ...], "by": [n, ...]}   -> {"counts": [...]}
+    {"op": "history"}                           -> {"items": [[w, n], ...]}
+    {"op": "top", "n": n}                       -> {"words": [...]}
+    {"op": "store", "items": [[w, n or null], ...]}   -> {}
+    {"op": "set_sources", "sources": [[pattern, url, type], ...]}  -> {}
+
+"record" counts a lookup of a word ("by" lookups each with record_batch),
+"store" writes absolute counts the way a history store does (null removes
+the word). Clients count lookups with "record" so they add up across
+clients, and keep "store" for explicit edits.
+"""
+from typing import *
+import argparse
+import heapq
+import json
+import os
+import re
+import socket
+import socketserver
+import sys
+from threading import Lock
+
+from base_history_store import HistoryLockedError
+from journal_history_store import JournalHistoryStore
+import regex_profiler
+from persistence_service import persistence
+from sqlite_history_store import SqliteHistoryStore
+from url_resolver import UrlResolver
+
+DEFAULT_SOCKET = "selection_dict.sock"
+
+
+class LookupService:
+    """The resolver and history behind the socket, safe to call from any thread."""
+
+    def __init__(self, history_backend="journal") -> None:
+        if history_backend == "sqlite":
+            self.history_store = SqliteHistoryStore("history.sqlite3")
+        else:
+            self.history_store = JournalHistoryStore("history.txt")
+
+        self.url_resolver = UrlResolver()
+
+        self._lock = Lock()
+        self._counts: Dict[str, int] = dict(self.history_store.load())
+
+        self._handlers: Dict[str, Callable[[dict], dict]] = {
+            "resolve": lambda r: {"url": self.url_resolver.resolve(r["word"])},
+            "resolve_batch": lambda r: {"urls": self.url_resolver.resolve_batch(r["words"])},
+            "resolve_all": lambda r: {"urls": self.url_resolver.resolve_all(r["word"])},
+            "record": lambda r: {"count": self.record_many([r["word"]])[0]},
+            "record_batch": lambda r: {"counts": self.record_many(r["words"], r.get("by"))},
+            "history": lambda r: {"items": self.history()},
+            "top": lambda r: {"words": self.top(r["n"])},
+            "store": lambda r: self.store(r["items"]),
+            "set_sources": lambda r: self.set_sources(r["sources"]),
+        }
+
+    def handle(self, request: dict) -> dict:
+        try:
+            handler = self._handlers.get(request.get("op"))
+            if handler is None:
+                return {"ok": False, "error": f"unknown op {request.get('op')!r}"}
+            response = handler(request)
+        except (KeyError, TypeError, ValueError, AttributeError, re.error) as e:
+            return {"ok": False, "error": f"bad request: {e!r}"}
+
+        response["ok"] = True
+        return response
+
+    def record_many(self, words: List[str], by: Optional[List[int]] = None) -> List[int]:
+        if by is None:
+            by = [1] * len(words)
+        elif len(by) != len(words):
+            raise ValueError("words and by differ in length")
+
+        with self._lock:
+            counts = []
+            for word, added in zip(words, by):
+                count = self._counts.get(word, 0) + int(added)
+                self._counts[word] = count
+                counts.append(count)
+            self.history_store.record_many(zip(words, counts))
+        return counts
+
+    def store(self, items: List[Tuple[str, Optional[int]]]) -> dict:
+        with self._lock:
+            for word, count in items:
+                if count is None:
+                    self._counts.pop(word, None)
+                else:
+                    self._counts[word] = int(count)
+            self.history_store.record_many(items)
+        return {}
+
+    def history(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return list(self._counts.items())
+
+    def top(self, n: int) -> List[str]:
+        with self._lock:
+            items = heapq.nlargest(n, self._counts.items(), key=lambda item: item[1])
+        return [word for word, _ in items]
+
+    def set_sources(self, sources: List[List[str]]) -> dict:
+        # compile and time first, so bad patterns leave the current sources alone
+        UrlResolver._compile(sources)
+        patterns = [source[0] for source in sources]
+        costs = regex_profiler.profile(patterns)
+        for pattern, cost in zip(patterns, costs):
+            if cost is None or cost > regex_profiler.REJECT_SECS:
+                raise ValueError(f"pattern {pattern!r} is too slow to match")
+        self.url_resolver.costs.update(zip(patterns, costs))
+        self.url_resolver.source_data = sources
+        self.url_resolver.rebuild()
+        self.url_resolver.save_data()
+        return {}
+
+    def close(self):
+        self.history_store.close()
+        persistence.flush()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        service: LookupService = self.server.service
+
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request is not an object")
+                response = service.handle(request)
+            except ValueError as e:
+                response = {"ok": False, "error": f"bad json: {e}"}
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+
+
+class LookupDaemon(socketserver.ThreadingUnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: LookupService) -> None:
+        self.service = service
+
+        if os.path.exists(socket_path):
+            if is_running(socket_path):
+                raise OSError(f"a daemon is already listening on {socket_path}")
+            # left behind by a daemon that did not shut down
+            os.remove(socket_path)
+
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        os.remove(self.server_address)
+
+
+def is_running(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+            return True
+        except OSError:
+            return False
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve dictionary lookups over a Unix socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="path of the socket")
+    parser.add_argument("--history-backend", default="journal", choices=["journal", "sqlite"])
+    args = parser.parse_args()
+
+    try:
+        service = LookupService(args.history_backend)
+    except HistoryLockedError as e:
+        # the gui writes it, two writers would lose each other's lookups
+        print(f"{e}, close selection_dict first")
+        return 1
+
+    daemon = LookupDaemon(args.socket, service)
+    print(f"listening on {args.socket}")
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+        service.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""Every lookup as a timestamped event, stored column by column.
+
+The log keeps three parallel arrays, one entry per lookup: the word id,
+the time (unix seconds) and the source id. Words and sources are numbered
+in order of first appearance. On disk each column is its own file of raw
+array items that lookups are appended to, so loading millions of events
+is one read per column:
+
+    <prefix>.word_ids  <prefix>.times  <prefix>.source_ids
+    <prefix>.words     <prefix>.sources    (one name per line, line = id)
+
+Aggregates use numpy when it is installed and plain loops otherwise.
+"""
+from typing import *
+import heapq
+import os
+import re
+import time
+from array import array
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DAY = 24 * 60 * 60
+
+# everything str.splitlines breaks a line at
+_LINE_BREAKS = re.compile("[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+class LookupEventLog:
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+        self._lock = Lock()
+
+        self._word_ids = array('I')
+        self._times = array('I')
+        self._source_ids = array('H')
+
+        self._words: List[str] = []
+        self._word_id_of: Dict[str, int] = {}
+        self._sources: List[str] = []
+        self._source_id_of: Dict[str, int] = {}
+        # word id -> time of its latest lookup, for per-row coloring and sorting
+        self._last_seen = array('I')
+
+        self._load()
+        self._files = {name: open(f"{prefix}.{name}", 'ab')
+                       for name in ("word_ids", "times", "source_ids")}
+        self._names = {name: open(f"{prefix}.{name}", 'a', encoding='utf-8', newline='')
+                       for name in ("words", "sources")}
+
+    def _load(self):
+        for name, ids in (("words", self._word_id_of), ("sources", self._source_id_of)):
+            path = f"{self.prefix}.{name}"
+            if not os.path.exists(path):
+                continue
+            # newline='' so that only "\n" ends a name
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                names = f.read().split("\n")[:-1]
+            getattr(self, "_" + name).extend(names)
+            ids.update((n, i) for i, n in enumerate(names))
+
+        columns = (("word_ids", self._word_ids), ("times", self._times),
+                   ("source_ids", self._source_ids))
+        for name, column in columns:
+            path = f"{self.prefix}.{name}"
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                column.frombytes(data[:len(data) - len(data) % column.itemsize])
+
+        # a crash can leave the columns (or the names) uneven, drop the torn tail
+        count = min(len(self._word_ids), len(self._times), len(self._source_ids))
+        while count > 0 and (self._word_ids[count - 1] >= len(self._words)
+                             or self._source_ids[count - 1] >= len(self._sources)):
+            count -= 1
+        for name, column in columns:
+            if len(column) > count:
+                del column[count:]
+                with open(f"{self.prefix}.{name}", 'r+b') as f:
+                    f.truncate(count * column.itemsize)
+
+        self._last_seen = array('I', bytes(4 * len(self._words)))
+        if numpy is not None and count > 0:
+            last_seen = numpy.zeros(len(self._words), dtype=numpy.uint32)
+            numpy.maximum.at(last_seen, numpy.frombuffer(self._word_ids, dtype=numpy.uint32),
+                             numpy.frombuffer(self._times, dtype=numpy.uint32))
+            self._last_seen = array('I', last_seen.tobytes())
+        else:
+            for word_id, t in zip(self._word_ids, self._times):
+                if t > self._last_seen[word_id]:
+                    self._last_seen[word_id] = t
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    @staticmethod
+    def _name(name: str) -> str:
+        # names are stored one per line
+        return _LINE_BREAKS.sub(" ", name)
+
+    def _id_of(self, name: str, names: List[str], ids: Dict[str, int], file: str) -> int:
+        name = self._name(name)
+        i = ids.get(name)
+        if i is None:
+            i = len(names)
+            names.append(name)
+            ids[name] = i
+            self._names[file].write(name + "\n")
+            self._names[file].flush()
+        return i
+
+    def record(self, word: str, source="", timestamp: Optional[float] = None):
+        t = int(time.time() if timestamp is None else timestamp)
+
+        with self._lock:
+            word_id = self._id_of(word, self._words, self._word_id_of, "words")
+            source_id = self._id_of(source, self._sources, self._source_id_of, "sources")
+
+            self._word_ids.append(word_id)
+            self._times.append(t)
+            self._source_ids.append(source_id)
+
+            if word_id == len(self._last_seen):
+                self._last_seen.append(t)
+            elif t > self._last_seen[word_id]:
+                self._last_seen[word_id] = t
+
+            # names first, so an event on disk always has its names
+            for name, column in (("word_ids", self._word_ids), ("times", self._times),
+                                 ("source_ids", self._source_ids)):
+                self._files[name].write(column[-1:].tobytes())
+                self._files[name].flush()
+
+    def last_seen(self, word: str) -> Optional[int]:
+        """Unix time of the latest lookup of `word`."""
+        word_id = self._word_id_of.get(self._name(word))
+        if word_id is None:
+            return None
+        return self._last_seen[word_id]
+
+    def per_day_counts(self, days=7, now: Optional[float] = None) -> List[int]:
+        """Lookups on each of the last `days` local days, oldest first."""
+        now = time.time() if now is None else now
+        offset = time.localtime(now).tm_gmtoff
+        today = (int(now) + offset) // DAY
+
+        with self._lock:
+            if numpy is not None:
+                times = numpy.frombuffer(self._times, dtype=numpy.uint32)
+                day = (times.astype(numpy.int64) + offset) // DAY - (today - days + 1)
+                day = day[(day >= 0) & (day < days)]
+                return numpy.bincount(day, minlength=days).tolist()
+
+            counts = [0] * days
+            for t in self._times:
+                day = (t + offset) // DAY - (today - days + 1)
+                if 0 <= day < days:
+                    counts[day] += 1
+            return counts
+
+    def scores(self, half_life_days: Optional[float] = None, since: Optional[float] = None,
+               now: Optional[float] = None) -> Dict[str, float]:
+        """Lookup count of every word since `since`, or with `half_life_days`
+        every lookup weighted by 2 ** -(its age / half life)."""
+        now = time.time() if now is None else now
+
+        with self._lock:
+            if numpy is not None:
+                ids = numpy.frombuffer(self._word_ids, dtype=numpy.uint32)
+                times = numpy.frombuffer(self._times, dtype=numpy.uint32)
+
+                weights = None
+                if half_life_days is not None:
+                    weights = numpy.exp2((times.astype(numpy.float64) - now) / (half_life_days * DAY))
+                if since is not None:
+                    keep = times >= since
+                    ids = ids[keep]
+                    if weights is not None:
+                        weights = weights[keep]
+
+                totals = numpy.bincount(ids, weights, minlength=len(self._words))
+                return {self._words[i]: float(totals[i]) for i in numpy.flatnonzero(totals)}
+
+            totals = [0.0] * len(self._words)
+            for word_id, t in zip(self._word_ids, self._times):
+                if since is not None and t < since:
+                    continue
+                if half_life_days is None:
+                    totals[word_id] += 1
+                else:
+                    totals[word_id] += 2 ** ((t - now) / (half_life_days * DAY))
+            return {self._words[i]: total for i, total in enumerate(totals) if total > 0}
+
+    def top(self, k: int, half_life_days: Optional[float] = None, since: Optional[float] = None,
+            now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """The `k` highest scoring words, see `scores`."""
+        scores = self.scores(half_life_days, since, now)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def close(self):
+        with self._lock:
+            for f in list(self._files.values()) + list(self._names.values()):
+                f.close()
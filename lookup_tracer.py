@@ -0,0 +1,85 @@
+"""Stage timestamps of a lookup, from the double-click to the rendered page.
+
+A lookup is traced through the module level `tracer`: `begin` returns a
+LookupTrace for the double-click, which travels with the lookup and is
+marked as it passes each stage. Lookups can overlap (a click arrives
+while the previous page is still loading), so every lookup keeps its own
+trace; one that is never rendered is simply dropped.
+"""
+from typing import *
+import json
+import time
+from threading import Lock
+from urllib.parse import urlsplit
+
+from latency_stats import LatencyStats
+
+STAGES = ["clicked", "grabbed", "resolved", "delivered", "rendered"]
+
+
+def source_of(url: str) -> str:
+    """The key lookups of `url` are grouped under, its host."""
+    parts = urlsplit(url)
+    return parts.netloc or parts.scheme
+
+
+class LookupTrace:
+    """Stage times of one lookup, see LookupTracer.begin."""
+
+    def __init__(self, tracer: "LookupTracer", clicked: float) -> None:
+        self._tracer = tracer
+        self.times: Dict[str, float] = {STAGES[0]: clicked}
+        self.source: Optional[str] = None
+
+    def mark(self, stage: str, url: Optional[str] = None):
+        self._tracer._mark(self, stage, url)
+
+
+class LookupTracer:
+
+    def __init__(self, window=1000) -> None:
+        self._lock = Lock()
+
+        # time spent reaching each stage from the one before it
+        self.stage_stats = {stage: LatencyStats(window) for stage in STAGES[1:]}
+        # click to rendered page, per dictionary source
+        self.source_stats: Dict[str, LatencyStats] = {}
+        self._window = window
+
+    def begin(self, ago=0.0) -> LookupTrace:
+        """Start tracing a lookup whose double-click was `ago` seconds back."""
+        return LookupTrace(self, time.perf_counter() - ago)
+
+    def _mark(self, trace: LookupTrace, stage: str, url: Optional[str]):
+        now = time.perf_counter()
+
+        with self._lock:
+            # each stage counts once, the first time it is reached
+            if stage in trace.times or STAGES[-1] in trace.times:
+                return
+
+            self.stage_stats[stage].add(now - max(trace.times.values()))
+            trace.times[stage] = now
+
+            if url is not None:
+                trace.source = source_of(url)
+
+            if stage == STAGES[-1] and trace.source is not None:
+                if trace.source not in self.source_stats:
+                    self.source_stats[trace.source] = LatencyStats(self._window)
+                self.source_stats[trace.source].add(now - trace.times[STAGES[0]])
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            sources = dict(self.source_stats)
+
+        return {
+            "stages": {stage: stats.summary() for stage, stats in self.stage_stats.items()},
+            "sources": {source: stats.summary() for source, stats in sources.items()}
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=4)
+
+
+tracer = LookupTracer()
@@ -1,8 +1,11 @@
+import startup_timing
+
 from typing import *
 import shutil
 import os
 import sys
 import json
+import time
 
 from PySide2.QtCore import *
 from PySide2.QtWidgets import *
@@ -11,10 +14,18 @@ from PySide2.QtGui import *
 import pyperclip
 from dict_source_editor import DictionarySourceEditor
 
+from diagnostics_dialog import DiagnosticsDialog
 from engine import Engine
+from lookup_event_log import DAY
+from persistence_service import persistence
 from theme import palette
-from word_history import WordHistory
-from dict_window import DictWindow
+from table_item_delegate import TableItemDelegate
+from url_resolver import WEB
+from word_search_proxy_model import WordSearchProxyModel
+
+startup_timing.mark("imports")
+
+WORD_FILE_FILTER = "CSV (*.csv);;TSV (*.tsv);;Anki text (*.txt)"
 
 
 class ListeningStatusIndicator(QLabel):
@@ -53,125 +64,49 @@ class ListeningStatusIndicator(QLabel):
         self.setPixmap(self.red_dot)
 
 
-class TableItemDelegateSignals(QObject):
-    selected = Signal(str, int, int)
-
-
-class TableItemDelegate(QStyledItemDelegate):
-
-    def __init__(self, engine: Engine, menu: QMenu) -> None:
-        super().__init__()
-
-        self.signals = TableItemDelegateSignals()
-
-        self._engine = engine
-
-        self._icon_cache: Dict[str, QPixmap] = {}
-        self._hover_icon_cache: Dict[str, QPixmap] = {}
-        self._selected_icon_cache: Dict[str, QPixmap] = {}
-
-        self.state_to_cache = {
-            "normal": self._icon_cache,
-            "hover": self._hover_icon_cache,
-            "selected": self._selected_icon_cache
-        }
-
-        self.state_to_color = {
-            "normal": QColor.fromRgb(200, 200, 200),
-            "hover": QColor.fromRgb(255, 255, 255),
-            "selected": QColor.fromRgb(50, 50, 50)
-        }
-
-        self._menu = menu
-
-    def editorEvent(self, event: QEvent, model: QAbstractItemModel, option: QStyleOptionViewItem, index: QModelIndex) -> bool:
-        if event.type() == QEvent.MouseButtonRelease:
-
-            mouse_event: QMouseEvent = event
-
-            if mouse_event.button() == Qt.LeftButton:
-
-                model: WordHistory = index.model()
-                word: str = model.data(model.createIndex(
-                    index.row(), 0), Qt.DisplayRole)
-
-                if index.column() == 2:
-
-                    self.signals.selected.emit(self._engine.url_resolver.resolve(
-                        word), mouse_event.globalX(), mouse_event.globalY())
-
-                elif index.column() == 3:
-                    model.remove_word(word)
-            elif mouse_event.button() == Qt.RightButton:
-                self._menu.exec_(mouse_event.globalPos())
-
-        return super().editorEvent(event, model, option, index)
-
-    def _get_icon(self, icon_path: str, flag: QStyle.StateFlag):
-
-        # determine state
-        state = "normal"
-        if flag & QStyle.State_MouseOver > 0:
-            state = "hover"
-        elif flag & QStyle.State_Selected > 0:
-            state = "selected"
-
-        cache = self.state_to_cache[state]
-
-        if icon_path in cache:
-            return cache[icon_path]
-
-        # cache miss
-
-        # read the image file specified by the model
-        pixmap = QPixmap(icon_path)
-
-        # fill icon with desired color
-        mask = pixmap.createMaskFromColor(QColor('black'), Qt.MaskOutColor)
-
-        pixmap.fill(self.state_to_color[state])
-        pixmap.setMask(mask)
-        cache[icon_path] = pixmap
-
-        return pixmap
-
-    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
-        # return super().paint(painter, option, index)
-        if index.column() >= 2:
-            # paint QIcon here using data provided by the model
-            icon_path = index.data()
-            icon = QIcon(self._get_icon(icon_path, option.state))
-
-            opt = QStyleOptionViewItem(option)
-            self.initStyleOption(opt, index)
-
-            icon_size = 20
-            opt.icon = icon
-            opt.decorationSize = QSize(icon_size, icon_size)
-            opt.features = QStyleOptionViewItem.HasDecoration
-            opt.text = ""
-
-            opt.widget.style().drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
-        else:
-            return super().paint(painter, option, index)
-
-
 class MainWindow(QMainWindow):
     def __init__(self) -> None:
         super().__init__()
 
         self.is_listening = False
-        self.dict_win = DictWindow()
 
-        self.engine = Engine()
+        self._read_config()
+        startup_timing.mark("config")
+
+        # QtWebEngine is brought up after the first paint, see _create_dict_win
+        self.dict_win = None
+        self.prefetcher = None
+        self._painted = False
+
+        self.engine = Engine(
+            history_backend=self.config.get("history_backend", "journal"),
+            grab_deadline=self.config.get("grab_deadline", 0.3),
+            hedge_sources=self.config.get("hedge_sources", 1),
+            daemon_socket=self.config.get("daemon_socket"),
+            input_process=self.config.get("input_process", False))
         self.engine.signals.selected.connect(self._show_dict)
+        self.engine.signals.selected_many.connect(self._show_dict_many)
+        self.engine.signals.history_loaded.connect(
+            self._handle_history_loaded)
 
         self.main_layout = QVBoxLayout()
 
         self.listen_btn = QPushButton("Start Listening")
         self.listen_btn.clicked.connect(self._handle_start_btn)
+        # lookups before the history is in the model would be lost
+        self.listen_btn.setEnabled(False)
         self.main_layout.addWidget(self.listen_btn)
 
+        # search box, filters the vocab list as you type
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search")
+        self.search_edit.setClearButtonEnabled(True)
+        self.main_layout.addWidget(self.search_edit)
+
+        self.search_proxy_model = WordSearchProxyModel(
+            self.engine.word_history_model)
+        self.search_edit.textChanged.connect(self.search_proxy_model.set_query)
+
         # Vocab list table
         self.vocab_list_table = QTableView()
         self.vocab_list_table.setStyleSheet("""
@@ -179,7 +114,7 @@ QTableView::item:selected{
     background-color: rgb(149, 187, 232);
 }
         """)
-        self.vocab_list_table.setModel(self.engine.word_history_model)
+        self.vocab_list_table.setModel(self.search_proxy_model)
         self.vocab_list_table.setSelectionMode(
             QAbstractItemView.SingleSelection)
         self.vocab_list_table.setSelectionBehavior(
@@ -201,7 +136,7 @@ QHeaderView::section:checked {
 
         self.vocab_list_table.viewport().setMouseTracking(True)
         self.vocab_list_table_delegate = TableItemDelegate(
-            self.engine, self.word_menu)
+            self.engine.url_resolver, self.word_menu)
         self.vocab_list_table_delegate.signals.selected.connect(
             self._show_dict)
         self.vocab_list_table.setItemDelegate(self.vocab_list_table_delegate)
@@ -224,19 +159,79 @@ QHeaderView::section:checked {
         self.listeining_status_text = QLabel("not listening")
         self.statusBar().addWidget(self.listeining_status_text)
 
+        self.cache_status_text = QLabel()
+        self.statusBar().addPermanentWidget(self.cache_status_text)
+        self._update_cache_status()
+
         self.main_widget = QWidget()
         self.main_widget.setLayout(self.main_layout)
         self.setCentralWidget(self.main_widget)
 
         self._load_config()
 
-    def _load_config(self):
+    def paintEvent(self, event: QPaintEvent) -> None:
+        super().paintEvent(event)
+
+        if not self._painted:
+            self._painted = True
+            startup_timing.mark("first paint")
+            QTimer.singleShot(0, self._finish_startup)
+
+    def _finish_startup(self):
+        self.engine.load_history()
+        self._create_dict_win()
+        startup_timing.mark("web engine")
+
+        # open a view on each dictionary site
+        self.dict_win.warm_up(
+            url for _, url, source_type in self.engine.url_resolver.source_data
+            if source_type == WEB)
+
+    def _handle_history_loaded(self):
+        startup_timing.mark("model load")
+        if self.config.get("word_order", "added") != "added":
+            self.engine.word_history_model.sort_by(self.config["word_order"])
+        self.listen_btn.setEnabled(True)
+        print(startup_timing.report())
+
+    def _create_dict_win(self):
+        if self.dict_win is not None:
+            return
+
+        from dict_window import DictWindow
+        from prefetcher import Prefetcher
+
+        self.dict_win = DictWindow(
+            page_cache_bytes=self.config.get(
+                "page_cache_bytes", 64 * 1024 * 1024),
+            http_cache_bytes=self.config.get(
+                "http_cache_bytes", 128 * 1024 * 1024),
+            max_views=self.config.get("dict_max_views", 4),
+            freeze_secs=self.config.get("dict_freeze_secs", 30),
+            discard_secs=self.config.get("dict_discard_secs", 300),
+            renderer_budget_bytes=self.config.get("renderer_budget_bytes", 0))
+        self.dict_win.signals.cache_updated.connect(
+            self._update_cache_status)
+        self.dict_win.signals.footprint_updated.connect(
+            self._update_cache_status)
+
+        self.prefetcher = Prefetcher(
+            self.engine.word_history_model, self.engine.url_resolver,
+            self.dict_win.profile, self.dict_win.page_cache,
+            top_n=self.config.get("prefetch_top_n", 50),
+            max_concurrent=self.config.get("prefetch_max_concurrent", 1))
+        self.prefetcher.start()
+
+        self._update_cache_status()
+
+    def _read_config(self):
         if not os.path.exists("config.json"):
             shutil.copy("config.default.json", "config.json")
 
         with open("config.json", 'r', encoding='utf-8') as f:
             self.config = json.load(f)
 
+    def _load_config(self):
         # restore opacity
         opacity = self.config["dict_opacity"]
         idx = int(int(opacity * 100) / 5)
@@ -247,27 +242,39 @@ QHeaderView::section:checked {
             self._enable_always_on_top()
             self.always_on_top_action.setChecked(True)
 
-    def _save_config(self):
+        # restore the row coloring, the row order is restored once the history is loaded
+        if self.config.get("color_by_recency", False):
+            self.engine.word_history_model.set_color_by_recency(True)
+            self.color_by_recency_action.setChecked(True)
+
+        word_order = self.config.get("word_order", "added")
+        for action in self.word_order_action_group.actions():
+            action.setChecked(action.data() == word_order)
 
-        with open("config.json", 'w', encoding='utf-8') as f:
-            json.dump(self.config, f)
+    def _save_config(self):
+        persistence.schedule("config.json", json.dumps(self.config))
 
     def _set_opacity(self, opacity: float):
         print(f"set opacity {opacity}")
         self.config["dict_opacity"] = opacity
+        self._save_config()
 
     def _get_opacity(self):
         return self.config["dict_opacity"]
 
+    def _selected_row(self) -> int:
+        """Row of the selected word in the history model."""
+        index = self.vocab_list_table.selectionModel().selectedIndexes()[0]
+        return self.search_proxy_model.mapToSource(index).row()
+
     def _copy_selected_word(self):
-        row = self.vocab_list_table.selectionModel().selectedIndexes()[0].row()
+        row = self._selected_row()
         word = self.engine.word_history_model.data(
             self.engine.word_history_model.createIndex(row, 0), Qt.DisplayRole)
         pyperclip.copy(word)
 
     def _reset_selected_word_count(self):
-        row = self.vocab_list_table.selectionModel().selectedIndexes()[0].row()
-        self.engine.word_history_model.reset_count(row)
+        self.engine.word_history_model.reset_count(self._selected_row())
 
     def _create_menu(self):
 
@@ -298,10 +305,53 @@ QHeaderView::section:checked {
             self.opacity_action_group.addAction(action)
 
         self.dict_opacity_menu.addActions(self.opacity_action_group.actions())
+
+        self.word_order_menu = self.options_menu.addMenu("&Sort Words")
+
+        self.word_order_action_group = QActionGroup(self)
+
+        for order, label in (("added", "First Looked Up"), ("count", "Most Looked Up"),
+                             ("recency", "Most Recently Looked Up")):
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setData(order)
+
+            def closure():
+
+                word_order = order
+
+                return lambda: self._sort_words(word_order)
+
+            action.triggered.connect(closure())
+            self.word_order_action_group.addAction(action)
+
+        self.word_order_menu.addActions(self.word_order_action_group.actions())
+
+        self.color_by_recency_action = QAction("Color by Recency")
+        self.color_by_recency_action.setCheckable(True)
+        self.color_by_recency_action.triggered.connect(
+            self._handle_color_by_recency_action)
+        self.options_menu.addAction(self.color_by_recency_action)
+
+        self.lookup_stats_action = QAction("Lookups This Week")
+        self.lookup_stats_action.triggered.connect(self._show_lookup_stats)
+        self.options_menu.addAction(self.lookup_stats_action)
         self.source_editor_action = QAction("Edit Dictionary Sources")
         self.source_editor_action.triggered.connect(self._show_source_editor)
         self.options_menu.addAction(self.source_editor_action)
 
+        self.import_action = QAction("Import Words...")
+        self.import_action.triggered.connect(self._import_words)
+        self.options_menu.addAction(self.import_action)
+
+        self.export_action = QAction("Export Words...")
+        self.export_action.triggered.connect(self._export_words)
+        self.options_menu.addAction(self.export_action)
+
+        self.diagnostics_action = QAction("Lookup Diagnostics")
+        self.diagnostics_action.triggered.connect(self._show_diagnostics)
+        self.options_menu.addAction(self.diagnostics_action)
+
         self.word_menu = QMenu()
         self.copy_word_action = QAction("Copy Word")
         self.copy_word_action.triggered.connect(self._copy_selected_word)
@@ -312,14 +362,81 @@ QHeaderView::section:checked {
         self.word_menu.addAction(self.reset_count_action)
 
     def closeEvent(self, event: QCloseEvent) -> None:
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
         self.engine.save_history()
         self.engine.url_resolver.save_data()
         self._save_config()
+        # the files are written on another thread, don't hang on a stuck disk
+        if not persistence.flush(timeout=2.0):
+            print("settings were not saved in time")
 
     def _show_source_editor(self):
-        editor = DictionarySourceEditor(self.engine.url_resolver.source_data)
+        editor = DictionarySourceEditor(self.engine.url_resolver.source_data,
+                                        self.engine.url_resolver.quarantined,
+                                        self.engine.url_resolver.costs)
+        editor.source_model.signals.changed.connect(
+            self.engine.update_sources)
         editor.exec_()
 
+    def _import_words(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import Words", "", WORD_FILE_FILTER)
+
+        if len(path) == 0:
+            return
+
+        count = self.engine.word_history_model.import_words(path)
+        self.statusBar().showMessage(f"imported {count} words", 5000)
+
+    def _export_words(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Words", "vocabulary.csv", WORD_FILE_FILTER)
+
+        if len(path) == 0:
+            return
+
+        self.engine.word_history_model.export_words(
+            path, urls_for=self.engine.url_resolver.resolve_batch)
+
+    def _sort_words(self, order: str):
+        self.config["word_order"] = order
+        self._save_config()
+        self.engine.word_history_model.sort_by(order)
+
+    def _handle_color_by_recency_action(self, checked: bool):
+        self.config["color_by_recency"] = checked
+        self._save_config()
+        self.engine.word_history_model.set_color_by_recency(checked)
+
+    def _show_lookup_stats(self):
+        event_log = self.engine.event_log
+        if event_log is None:
+            self.statusBar().showMessage("lookups are still loading", 5000)
+            return
+
+        now = time.time()
+
+        # a long log takes a while to go through
+        self.engine.run_in_background(
+            lambda: (event_log.per_day_counts(7, now=now),
+                     event_log.top(10, since=now - 7 * DAY, now=now)),
+            lambda stats: self._show_lookup_stats_dialog(now, *stats))
+
+    def _show_lookup_stats_dialog(self, now: float, counts: List[int], top: List[Tuple[str, float]]):
+        days = [time.strftime("%a %m/%d", time.localtime(now - (6 - i) * DAY))
+                for i in range(7)]
+
+        text = "\n".join(f"{day}: {count}" for day, count in zip(days, counts))
+        text += "\n\nMost looked up:\n"
+        text += "\n".join(f"{word} ({count:.0f})" for word, count in top)
+
+        QMessageBox.information(self, "Lookups This Week", text)
+
+    def _show_diagnostics(self):
+        dialog = DiagnosticsDialog()
+        dialog.exec_()
+
     def _handle_always_on_top_action(self, checked: bool):
         if checked:
             self._enable_always_on_top()
@@ -329,20 +446,47 @@ QHeaderView::section:checked {
     def _enable_always_on_top(self):
         self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
         self.config["always_on_top"] = True
+        self._save_config()
         self.show()
 
     def _disble_always_on_top(self):
         self.setWindowFlags(self.windowFlags() & (~Qt.WindowStaysOnTopHint))
         self.config["always_on_top"] = False
+        self._save_config()
         self.show()
 
-    def _show_dict(self, url, x, y):
-        print(url)
+    def _show_dict(self, url, x, y, trace=None):
+        self._show_dict_many([url], x, y, trace)
+
+    def _show_dict_many(self, urls, x, y, trace=None):
+        if trace is not None:
+            trace.mark("delivered")
+        print(", ".join(urls))
+        self._create_dict_win()
+        for url in urls:
+            self.prefetcher.notify_lookup(url)
         self.dict_win.set_location(x, y)
-        self.dict_win.set_url(url)
+        self.dict_win.set_urls(urls, self.config.get("hedge_sources", 1), trace)
         self.dict_win.setWindowOpacity(self._get_opacity())
         self.dict_win.show()
 
+    def _update_cache_status(self):
+        if self.dict_win is None:
+            self.cache_status_text.setText("cache: not loaded")
+            return
+
+        cache = self.dict_win.page_cache
+        footprint = self.dict_win.footprint()
+        memory = "-"
+        if footprint["app"] is not None and footprint["renderers"] is not None:
+            memory = f"{(footprint['app'] + footprint['renderers']) / 1024 / 1024:.0f} MB"
+
+        self.cache_status_text.setText(
+            f"cache: {cache.hits} hits / {cache.misses} misses, "
+            f"{cache.total_bytes / 1024 / 1024:.1f} MB, "
+            f"prefetched {self.prefetcher.used}/{self.prefetcher.prefetched} used, "
+            f"memory {memory}")
+
     def _handle_start_btn(self):
         if self.is_listening:
             self.engine.stop_listening()
@@ -358,11 +502,15 @@ QHeaderView::section:checked {
         self.is_listening = not self.is_listening
 
 
-app = QApplication(sys.argv)
-# Force the style to be the same on all OSs
-app.setStyle("Fusion")
-# Apply dark theme using palette
-app.setPalette(palette)
-win = MainWindow()
-win.show()
-app.exec_()
+if __name__ == "__main__":
+    # lets QtWebEngineWidgets be imported after the application is created
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    app = QApplication(sys.argv)
+    # Force the style to be the same on all OSs
+    app.setStyle("Fusion")
+    # Apply dark theme using palette
+    app.setPalette(palette)
+    win = MainWindow()
+    startup_timing.mark("main window")
+    win.show()
+    app.exec_()
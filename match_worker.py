@@ -0,0 +1,196 @@
+"""Regex matching in a child process that can be killed.
+
+Python's re cannot be interrupted and holds the GIL while it matches, so
+a pattern that backtracks catastrophically would hang whoever called it.
+MatchWorker matches in a separate interpreter instead:
+
+    python match_worker.py PROGRESS_FILE
+
+reads pickled requests on stdin and writes pickled replies to stdout.
+Before every match it writes the number of matches so far and the index
+of the pattern to PROGRESS_FILE, which is mapped into both processes. A
+match that makes no progress for a timeout gets the worker killed and
+started again, and the pattern it was stuck on is reported in
+MatchTimeout.
+"""
+from typing import *
+import mmap
+import os
+import pickle
+import queue
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+from threading import Lock, Thread
+
+# matches started, index of the pattern of the last one
+_PROGRESS = struct.Struct("qi")
+
+
+class MatchTimeout(TimeoutError):
+
+    def __init__(self, pattern: int) -> None:
+        super().__init__(f"pattern {pattern} ran past the match timeout")
+        # index of the slow pattern
+        self.pattern = pattern
+
+
+class MatchWorker:
+
+    # seconds a new worker may take to start and compile the patterns
+    START_TIMEOUT = 10.0
+
+    def __init__(self, timeout: float) -> None:
+        """The worker is started with the first match."""
+        # seconds a single match may take
+        self.timeout = timeout
+        self.restarts = 0
+
+        self._lock = Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._replies: Optional[queue.Queue] = None
+        self._progress_path: Optional[str] = None
+        self._progress: Optional[mmap.mmap] = None
+        # the patterns the worker has compiled
+        self._patterns: Optional[List[str]] = None
+
+    def _spawn(self):
+        if self._progress is None:
+            fd, self._progress_path = tempfile.mkstemp(prefix="match_worker")
+            os.write(fd, bytes(_PROGRESS.size))
+            self._progress = mmap.mmap(fd, _PROGRESS.size)
+            os.close(fd)
+        # a new worker counts from zero
+        _PROGRESS.pack_into(self._progress, 0, 0, -1)
+
+        self._process = subprocess.Popen(
+            [sys.executable, __file__, self._progress_path],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._patterns = None
+
+        # replies are read on a thread, so waiting for one can time out
+        self._replies = queue.Queue()
+        Thread(target=self._read_replies, args=(self._process.stdout, self._replies),
+               daemon=True).start()
+
+    @staticmethod
+    def _read_replies(stdout, replies: queue.Queue):
+        try:
+            while True:
+                replies.put(pickle.load(stdout))
+        except (EOFError, OSError, pickle.UnpicklingError):
+            # killed, or gone by itself
+            replies.put(EOFError())
+
+    def _kill(self):
+        self._process.kill()
+        self._process.wait()
+        self._process.stdin.close()
+        self._process = None
+
+    def _request(self, op: str, arg: Any):
+        pickle.dump((op, arg), self._process.stdin)
+        self._process.stdin.flush()
+
+    def _reply(self, timeout: float) -> Any:
+        reply = self._replies.get(timeout=timeout)
+        if isinstance(reply, EOFError):
+            raise reply
+        return reply
+
+    def match(self, patterns: List[str], words: List[str], first: bool,
+              timeout: Optional[float] = None) -> List[List[int]]:
+        """Indices into `patterns` of the ones matching each word, in order,
+        only the first one if `first`.
+
+        Raises MatchTimeout once a match makes no progress for `timeout`
+        seconds (`self.timeout` by default), and OSError if the worker
+        cannot be used.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        with self._lock:
+            if self._process is None:
+                if self._progress is not None:
+                    self.restarts += 1
+                self._spawn()
+
+            try:
+                if patterns != self._patterns:
+                    self._request("patterns", patterns)
+                    self._reply(self.START_TIMEOUT)
+                    self._patterns = patterns
+
+                self._request("match", (words, first))
+
+                # a batch takes as long as it takes, as long as every match is quick
+                step, _ = _PROGRESS.unpack_from(self._progress)
+                while True:
+                    try:
+                        return self._reply(timeout)
+                    except queue.Empty:
+                        pass
+
+                    progress, current = _PROGRESS.unpack_from(self._progress)
+                    if progress == step:
+                        self._kill()
+                        raise MatchTimeout(current)
+                    step = progress
+            except MatchTimeout:
+                raise
+            except (EOFError, OSError, queue.Empty) as e:
+                if self._process is not None:
+                    self._kill()
+                raise OSError(f"match worker failed: {e!r}") from e
+
+    def close(self):
+        with self._lock:
+            if self._process is not None:
+                self._kill()
+            if self._progress is not None:
+                self._progress.close()
+                os.remove(self._progress_path)
+                self._progress = None
+
+
+def main() -> int:
+    with open(sys.argv[1], 'r+b') as f:
+        progress = mmap.mmap(f.fileno(), _PROGRESS.size)
+
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    patterns = []
+    step = 0
+
+    while True:
+        try:
+            op, arg = pickle.load(stdin)
+        except EOFError:
+            # the parent process is gone
+            return 0
+
+        if op == "patterns":
+            patterns = [re.compile(pattern) for pattern in arg]
+            reply = None
+        else:
+            words, first = arg
+            reply = []
+            for word in words:
+                matched = []
+                for i, pattern in enumerate(patterns):
+                    step += 1
+                    _PROGRESS.pack_into(progress, 0, step, i)
+                    if pattern.match(word) is not None:
+                        matched.append(i)
+                        if first:
+                            break
+                reply.append(matched)
+
+        pickle.dump(reply, stdout)
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
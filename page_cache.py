@@ -0,0 +1,107 @@
+from typing import *
+from collections import OrderedDict
+import hashlib
+import os
+
+
+class PageCache:
+    """Rendered dictionary pages on disk, keyed by url and evicted LRU.
+
+    Each page lives in `<directory>/<sha1 of url>.html`. The file mtime
+    doubles as the last access time, so the LRU order survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        # file name -> size in bytes, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".html"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+
+        self._evict()
+
+    @staticmethod
+    def _name(url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest() + ".html"
+
+    def __contains__(self, url: str) -> bool:
+        return self._name(url) in self._entries
+
+    def get(self, url: str) -> Optional[str]:
+        name = self._name(url)
+
+        if name not in self._entries:
+            self.misses += 1
+            return None
+
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                html = f.read()
+        except OSError:
+            self._remove(name)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(name)
+        os.utime(path)
+
+        return html
+
+    def put(self, url: str, html: str):
+        name = self._name(url)
+        path = os.path.join(self.directory, name)
+        data = html.encode('utf-8')
+
+        if len(data) > self.max_bytes:
+            return
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._total_bytes -= self._entries.pop(name, 0)
+        self._entries[name] = len(data)
+        self._total_bytes += len(data)
+
+        self._evict()
+
+    def clear(self):
+        for name in list(self._entries):
+            self._remove(name)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 0:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, name: str):
+        self._total_bytes -= self._entries.pop(name)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
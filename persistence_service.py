@@ -0,0 +1,100 @@
+"""Debounced, atomic saving of the small settings files.
+
+Components hand the full new content of a file to the module level
+`persistence` whenever it changes. Each file is written on a background
+thread once it has been left alone for `delay` seconds (or after
+`max_delay` at the latest), through a temp file that is renamed over the
+old one, so a crash never leaves a half written file behind.
+"""
+from typing import *
+import os
+import time
+from threading import Condition, Thread
+
+
+def write_atomic(path: str, content: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class PersistenceService:
+
+    def __init__(self, delay=1.0, max_delay=10.0) -> None:
+        self.delay = delay
+        self.max_delay = max_delay
+
+        # path -> (content, when to write it, latest time to write it)
+        self._pending: Dict[str, Tuple[str, float, float]] = {}
+        self._writing = False
+        self._cond = Condition()
+        self._thread: Optional[Thread] = None
+
+    def schedule(self, path: str, content: str):
+        """Write `content` to `path` soon, replacing any unwritten content."""
+        now = time.monotonic()
+
+        with self._cond:
+            old = self._pending.get(path)
+            deadline = now + self.max_delay if old is None else old[2]
+            self._pending[path] = (content, min(now + self.delay, deadline), deadline)
+
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+            self._cond.notify_all()
+
+    def flush(self, timeout=2.0) -> bool:
+        """Write everything pending now, False if that took longer than `timeout`."""
+        end = time.monotonic() + timeout
+
+        with self._cond:
+            now = time.monotonic()
+            for path, (content, _, deadline) in self._pending.items():
+                self._pending[path] = (content, now, deadline)
+            self._cond.notify_all()
+
+            while len(self._pending) > 0 or self._writing:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if len(self._pending) == 0:
+                        self._cond.wait()
+                        continue
+
+                    due = min(when for _, when, _ in self._pending.values())
+                    if due <= now:
+                        break
+                    self._cond.wait(due - now)
+
+                ready = [(path, content) for path, (content, when, _) in self._pending.items()
+                         if when <= now]
+                for path, _ in ready:
+                    del self._pending[path]
+                self._writing = True
+
+            for path, content in ready:
+                try:
+                    write_atomic(path, content)
+                except OSError as e:
+                    print(f"cannot save {path}: {e}")
+
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+persistence = PersistenceService()
@@ -0,0 +1,124 @@
+from typing import *
+from collections import deque
+import time
+
+from PySide2.QtCore import *
+from PySide2.QtWebEngineWidgets import *
+
+from dict_window import MAX_HTML_BYTES
+from local_dictionary import is_local_url
+from page_cache import PageCache
+from url_resolver import UrlResolver
+from word_history import WordHistory
+
+
+class Prefetcher(QObject):
+    """Warms the page cache with the most looked-up words while idle.
+
+    Pages are loaded in hidden QWebEnginePages sharing the dictionary
+    window's profile, at most `max_concurrent` at a time and one new load
+    per timer tick. Any lookup by the user pauses prefetching for
+    `pause_secs`. The list of top words is rebuilt at most every
+    `refill_secs`.
+    """
+
+    def __init__(self, history: WordHistory, resolver: UrlResolver, profile: QWebEngineProfile,
+                 page_cache: PageCache, top_n=50, max_concurrent=1, interval_ms=2000, pause_secs=10, refill_secs=300) -> None:
+        super().__init__()
+
+        self._history = history
+        self._resolver = resolver
+        self._profile = profile
+        self._page_cache = page_cache
+
+        self.top_n = top_n
+        self.max_concurrent = max_concurrent
+        self.pause_secs = pause_secs
+        self.refill_secs = refill_secs
+
+        # stats
+        self.prefetched = 0
+        self.used = 0
+
+        self._queue: Deque[str] = deque()
+        self._in_flight: Dict[QWebEnginePage, str] = {}
+        # prefetched urls the user has not looked up yet
+        self._unused: Set[str] = set()
+        self._paused_until = 0
+        self._next_refill = 0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        if self.max_concurrent > 0 and self.top_n > 0:
+            self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        for page in list(self._in_flight):
+            self._release(page)
+
+    def notify_lookup(self, url: str):
+        """Called for every user lookup, pauses prefetching for a while."""
+        self._paused_until = time.monotonic() + self.pause_secs
+
+        if url in self._unused:
+            self._unused.discard(url)
+            self.used += 1
+
+    def _tick(self):
+        if time.monotonic() < self._paused_until:
+            return
+
+        if len(self._in_flight) >= self.max_concurrent:
+            return
+
+        if len(self._queue) == 0 and time.monotonic() >= self._next_refill:
+            self._next_refill = time.monotonic() + self.refill_secs
+            self._refill()
+
+        while len(self._queue) > 0:
+            url = self._queue.popleft()
+            if url not in self._page_cache and url not in self._in_flight.values():
+                self._load(url)
+                break
+
+    def _refill(self):
+        for url in self._resolver.resolve_batch(self._history.top_words(self.top_n)):
+            if url is None or is_local_url(url):
+                continue
+            if url not in self._page_cache:
+                self._queue.append(url)
+
+    def _load(self, url: str):
+        page = QWebEnginePage(self._profile, self)
+        page.setAudioMuted(True)
+        page.loadFinished.connect(
+            lambda ok: self._handle_load_finished(page, ok))
+        self._in_flight[page] = url
+        page.load(QUrl(url))
+
+    def _handle_load_finished(self, page: QWebEnginePage, ok: bool):
+        url = self._in_flight.get(page)
+
+        if url is None:
+            return
+
+        if not ok:
+            self._release(page)
+            return
+
+        def store(html: str):
+            if len(html.encode('utf-8')) <= MAX_HTML_BYTES:
+                self._page_cache.put(url, html)
+                self._unused.add(url)
+                self.prefetched += 1
+            self._release(page)
+
+        page.toHtml(store)
+
+    def _release(self, page: QWebEnginePage):
+        self._in_flight.pop(page, None)
+        page.deleteLater()
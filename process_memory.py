@@ -0,0 +1,12 @@
+from typing import *
+import os
+
+
+def rss_of(pid: int) -> Optional[int]:
+    """Resident set size of process `pid` in bytes, None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
@@ -1,6 +1,8 @@
 from ast import Call, arg
 import time
-from threading import Thread
+import traceback
+from collections import deque
+from threading import Condition, Thread
 from typing import *
 from pynput.mouse import Listener, Button
 from base_mouse_listener import BaseMouseListener
@@ -8,13 +10,27 @@ from base_mouse_listener import BaseMouseListener
 
 class PynputMouseListener(BaseMouseListener):
 
-    def __init__(self, on_dbclick: Callable[[int, int], None], dbclick_gap=0.3) -> None:
+    def __init__(self, on_dbclick: Callable[[int, int, float], None], dbclick_gap=0.3, queue_size=8) -> None:
         super().__init__(on_dbclick, dbclick_gap)
 
         self._init_listener()
 
         self._last_click = 0
 
+        # Double-clicks are handed to a single worker. Whatever piles up
+        # while it is busy is coalesced into the latest click, and the
+        # oldest pending click is dropped once the queue is full.
+        self._events: Deque[Tuple[int, int, float]] = deque(maxlen=queue_size)
+        self._events_cond = Condition()
+
+        # stats
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+        self._worker = Thread(target=self._run_worker, daemon=True)
+        self._worker.start()
+
     def _init_listener(self):
         self._listener = Listener(
             on_click=self._handle_click
@@ -29,6 +45,13 @@ class PynputMouseListener(BaseMouseListener):
         self._listener.stop()
         self._init_listener()
 
+    def stats(self) -> Dict[str, int]:
+        return {
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped
+        }
+
     def _handle_click(self, x, y, btn, pressed):
 
         if btn == Button.left and pressed:
@@ -37,7 +60,25 @@ class PynputMouseListener(BaseMouseListener):
             diff = abs(current_time - self._last_click)
 
             if diff < self._dbclick_gap:
-                # self._on_dbclick()
-                Thread(target=self._on_dbclick, args=(x, y)).start()
+                with self._events_cond:
+                    if len(self._events) == self._events.maxlen:
+                        self.dropped += 1
+                    self._events.append((x, y, time.perf_counter()))
+                    self.received += 1
+                    self._events_cond.notify()
 
             self._last_click = current_time
+
+    def _run_worker(self):
+        while True:
+            with self._events_cond:
+                self._events_cond.wait_for(lambda: len(self._events) > 0)
+                x, y, clicked = self._events.pop()
+                self.coalesced += len(self._events)
+                self._events.clear()
+
+            try:
+                self._on_dbclick(x, y, clicked)
+            except Exception:
+                # keep the worker alive for the next click
+                traceback.print_exc()
@@ -1,24 +1,33 @@
+from typing import *
 import time
 
 import pyperclip
 
 from pynput.keyboard import Controller, Key
 from base_selection_grabber import BaseSelectionGrabber
+from latency_stats import LatencyStats
 
 
 class PynputSelectionGrabber(BaseSelectionGrabber):
 
-    def __init__(self) -> None:
+    def __init__(self, deadline=0.3) -> None:
         super().__init__()
         self._keyboard = Controller()
 
-    def grab(self) -> str:
+        # give up waiting for the copy after this many seconds
+        self.deadline = deadline
+        # time from sending Ctrl + C to having the selection
+        self.latency = LatencyStats()
+
+    def grab(self, clicked: Optional[float] = None) -> str:
         # backup clipboard content (text only)
         original_clipboard = pyperclip.paste()
 
         # set clipboard to "" in case nothing is selected
         pyperclip.copy("")
 
+        start = time.perf_counter()
+
         # send Ctrl + C to copy selected text
         self._keyboard.press(Key.ctrl)
         self._keyboard.press('c')
@@ -26,12 +35,27 @@ class PynputSelectionGrabber(BaseSelectionGrabber):
         self._keyboard.release(Key.ctrl)
 
         # wait for item to be copied into clipboard
-        time.sleep(0.1)
+        selection = self._wait_for_clipboard(start).strip()
 
-        # get clipboard content
-        selection = pyperclip.paste().strip()
+        self.latency.add(time.perf_counter() - start)
 
         # restore original clipboard content
         pyperclip.copy(original_clipboard)
 
         return selection
+
+    def _wait_for_clipboard(self, start: float) -> str:
+        # poll quickly at first, most copies land within a few ms
+        delay = 0.002
+
+        while True:
+            text = pyperclip.paste()
+            if len(text) > 0:
+                return text
+
+            remaining = self.deadline - (time.perf_counter() - start)
+            if remaining <= 0:
+                return ""
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.02)
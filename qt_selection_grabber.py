@@ -0,0 +1,78 @@
+from typing import *
+import time
+from threading import Condition
+
+from PySide2.QtCore import *
+from PySide2.QtGui import *
+
+from base_selection_grabber import BaseSelectionGrabber
+from latency_stats import LatencyStats
+
+
+class _SelectionReader(QObject):
+    """Lives in the GUI thread, where the clipboard may be touched."""
+
+    requested = Signal()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.text = ""
+        self.last_change = 0.0
+        self.changed = Condition()
+
+        self._clipboard = QGuiApplication.clipboard()
+        self._clipboard.selectionChanged.connect(self._handle_selection_changed)
+        # lets another thread run _read in the GUI thread and wait for it
+        self.requested.connect(self._read, Qt.BlockingQueuedConnection)
+
+    def read(self) -> str:
+        if QThread.currentThread() is self.thread():
+            self._read()
+        else:
+            self.requested.emit()
+        return self.text
+
+    def _read(self):
+        self.text = self._clipboard.text(QClipboard.Selection)
+
+    def _handle_selection_changed(self):
+        with self.changed:
+            # same clock as the click times of the mouse listener
+            self.last_change = time.perf_counter()
+            self.changed.notify_all()
+
+
+class QtSelectionGrabber(BaseSelectionGrabber):
+    """Reads the X11 PRIMARY selection, no keystrokes and no clipboard churn.
+
+    Must be created in the GUI thread. `grab` waits until the application
+    has published a selection at or after the double-click, at most until
+    `deadline` seconds after the click, then reads it.
+    """
+
+    def __init__(self, deadline=0.3) -> None:
+        super().__init__()
+        self.deadline = deadline
+        self.latency = LatencyStats()
+        self._reader = _SelectionReader()
+
+    @staticmethod
+    def is_available() -> bool:
+        return QGuiApplication.clipboard().supportsSelection()
+
+    def grab(self, clicked: Optional[float] = None) -> str:
+        start = time.perf_counter()
+        if clicked is None:
+            clicked = start
+
+        # the application may update the selection after we saw the click;
+        # re-selecting the same word does not always notify, hence the deadline
+        with self._reader.changed:
+            self._reader.changed.wait_for(
+                lambda: self._reader.last_change >= clicked,
+                max(0.0, clicked + self.deadline - start))
+
+        selection = self._reader.read().strip()
+        self.latency.add(time.perf_counter() - start)
+
+        return selection
@@ -0,0 +1,91 @@
+"""Measures how long dictionary source patterns take to match.
+
+A pattern with nested quantifiers like `(a+)+$` backtracks exponentially
+on inputs such as "aaaaaaaaaaaaaaaaaaaaaaaa!". Python's re cannot be
+interrupted, so patterns are timed in a separate interpreter that is
+killed once it runs past the timeout:
+
+    python regex_profiler.py PATTERN [PATTERN ...]
+
+prints the worst time per match of each pattern over CORPUS, in seconds,
+as a JSON list.
+"""
+from typing import *
+import json
+import re
+import subprocess
+import sys
+import time
+
+try:
+    # timed with the engine UrlResolver compiles with
+    import regex as engine
+except ImportError:
+    engine = re
+
+# worst time per match above which the editor warns about a pattern
+WARN_SECS = 100e-6
+# worst time per match above which a pattern is rejected
+REJECT_SECS = 2e-3
+
+# words a double-click selects, plus inputs that make bad patterns backtrack
+CORPUS = [
+    "hello", "dictionary", "well-known", "don't", "naïve", "Straße",
+    "日本語", "ひらがな", "カタカナ", "漢字かな交じり", "中文", "한국어",
+    "Hello World", "e-mail", "C++", "3.14", "2024-01-01", "",
+    "a" * 200, "x" * 1000, " " * 100, "日" * 200,
+] + [
+    adversarial
+    for length in (18, 24)
+    for unit in ("a", "1", " ", "ab", "aa", "a ", "あ", "-")
+    for adversarial in (unit * length + "!", unit * length + "\n")
+]
+
+# matches timed per corpus word, the fastest run counts
+_REPEAT = 5
+
+
+def _worst_time(pattern: str) -> float:
+    compiled = engine.compile(pattern)
+    worst = 0.0
+
+    for word in CORPUS:
+        best = float("inf")
+        for _ in range(_REPEAT):
+            start = time.perf_counter()
+            compiled.match(word)
+            best = min(best, time.perf_counter() - start)
+        worst = max(worst, best)
+
+    return worst
+
+
+def profile(patterns: List[str], timeout=1.0) -> List[Optional[float]]:
+    """Worst time per match of each pattern, None where it ran past `timeout`.
+
+    Patterns must compile.
+    """
+    if len(patterns) == 0:
+        return []
+
+    try:
+        result = subprocess.run([sys.executable, __file__, *patterns],
+                                capture_output=True, timeout=timeout)
+        return json.loads(result.stdout)
+    except subprocess.TimeoutExpired:
+        pass
+
+    if len(patterns) == 1:
+        return [None]
+
+    # find the slow ones
+    return [profile([pattern], timeout)[0] for pattern in patterns]
+
+
+def main() -> int:
+    print(json.dumps([_worst_time(pattern) for pattern in sys.argv[1:]]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
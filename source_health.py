@@ -0,0 +1,43 @@
+from typing import *
+from threading import Lock
+
+
+class SourceHealth:
+    """Expected page load time of each dictionary site.
+
+    Every finished load updates an exponentially weighted moving average
+    for its site, a failed load counts as a load of `FAILURE_SECS`. Sites
+    that were never measured rank first, so a new source gets tried.
+    """
+
+    ALPHA = 0.3
+    FAILURE_SECS = 10.0
+
+    def __init__(self) -> None:
+        self._expected: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def record(self, site: str, seconds: float):
+        with self._lock:
+            expected = self._expected.get(site)
+            if expected is None:
+                self._expected[site] = seconds
+            else:
+                self._expected[site] = expected + self.ALPHA * (seconds - expected)
+
+    def record_at_least(self, site: str, seconds: float):
+        """For a load cancelled after `seconds`, its real time is unknown."""
+        expected = self.expected(site)
+        if expected is None or expected < seconds:
+            self.record(site, seconds)
+
+    def record_failure(self, site: str):
+        self.record(site, self.FAILURE_SECS)
+
+    def expected(self, site: str) -> Optional[float]:
+        with self._lock:
+            return self._expected.get(site)
+
+    def rank(self, urls: Iterable[str], site_of: Callable[[str], str]) -> List[str]:
+        """`urls` fastest first, ties keep their order."""
+        return sorted(urls, key=lambda url: self.expected(site_of(url)) or 0.0)
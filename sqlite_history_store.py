@@ -0,0 +1,120 @@
+from typing import *
+import sqlite3
+from threading import Lock
+
+from base_history_store import BaseHistoryStore, lock_history
+from word_index import WordIndex
+
+
+class SqliteHistoryStore(BaseHistoryStore):
+    """History kept in a local SQLite database and read back in pages.
+
+    Rows are ordered by an autoincrement id, so paging with `fetch` walks
+    the history in the order the words were first looked up.
+    Only one process may write it, see lock_history.
+    """
+
+    paged = True
+
+    def __init__(self, path: str, read_only=False) -> None:
+        super().__init__()
+        self.path = path
+        self.read_only = read_only
+        # held while the store is open, raises HistoryLockedError if it is taken
+        self._lock_file = None if read_only else lock_history(path)
+        self._lock = Lock()
+
+        # lookups are recorded from the mouse listener thread
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                word TEXT NOT NULL UNIQUE,
+                count INTEGER NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS history_count ON history(count)")
+        self._conn.commit()
+
+        # the search rule of the model, casefold and all
+        self._conn.create_function("matches", 2, WordIndex.matches, deterministic=True)
+
+    def load(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT word, count FROM history ORDER BY id").fetchall()
+
+    def fetch(self, after_id: int, limit: int) -> List[Tuple[int, str, int]]:
+        """Return up to `limit` (id, word, count) rows with an id above `after_id`."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, word, count FROM history WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)).fetchall()
+
+    def search(self, query: str, after_id: int, limit: int) -> List[Tuple[int, str, int]]:
+        """Return up to `limit` (id, word, count) rows with an id above
+        `after_id` whose word matches `query` (see WordIndex)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, word, count FROM history WHERE id > ? AND matches(?, word) "
+                "ORDER BY id LIMIT ?", (after_id, query, limit)).fetchall()
+
+    def count_of(self, word: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT count FROM history WHERE word = ?", (word,)).fetchone()
+        return None if row is None else row[0]
+
+    def top(self, n: int) -> List[str]:
+        """Return the `n` words with the highest count."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT word FROM history ORDER BY count DESC LIMIT ?", (n,)).fetchall()
+        return [word for word, in rows]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM history LIMIT 1").fetchone() is None
+
+    def record(self, word: str, count: Optional[int]):
+        self.record_many([(word, count)])
+
+    def record_many(self, items: Iterable[Tuple[str, Optional[int]]]):
+        if self.read_only:
+            return
+
+        with self._lock:
+            for word, count in items:
+                self._write(word, count)
+            self._conn.commit()
+
+    def merge_many(self, items: Iterable[Tuple[str, int]]):
+        """Add `count` to the stored count of each word, in one transaction."""
+        if self.read_only:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO history (word, count) VALUES (?, ?) "
+                "ON CONFLICT(word) DO UPDATE SET count = count + excluded.count",
+                items)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _write(self, word: str, count: Optional[int]):
+        if count is None:
+            self._conn.execute("DELETE FROM history WHERE word = ?", (word,))
+        else:
+            self._conn.execute(
+                "INSERT INTO history (word, count) VALUES (?, ?) "
+                "ON CONFLICT(word) DO UPDATE SET count = excluded.count",
+                (word, count))
@@ -0,0 +1,22 @@
+"""Timestamps of the startup phases, relative to the first import of this module.
+
+Import it before anything else in main.py so the import phase is measured too.
+"""
+from typing import *
+import time
+
+_start = time.perf_counter()
+_marks: List[Tuple[str, float]] = []
+
+
+def mark(name: str):
+    _marks.append((name, time.perf_counter() - _start))
+
+
+def report() -> str:
+    lines = ["startup timing:"]
+    last = 0.0
+    for name, t in _marks:
+        lines.append(f"  {name:<20} {t * 1000:8.1f} ms  (+{(t - last) * 1000:.1f} ms)")
+        last = t
+    return "\n".join(lines)
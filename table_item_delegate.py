@@ -0,0 +1,123 @@
+from typing import *
+
+from PySide2.QtCore import *
+from PySide2.QtWidgets import *
+from PySide2.QtGui import *
+
+from lookup_tracer import tracer
+from url_resolver import UrlResolver
+from word_history import WordHistory
+
+
+class TableItemDelegateSignals(QObject):
+    # url, x, y and the LookupTrace of the lookup
+    selected = Signal(str, int, int, object)
+
+
+class TableItemDelegate(QStyledItemDelegate):
+
+    ICON_SIZE = 20
+
+    def __init__(self, url_resolver: UrlResolver, menu: QMenu) -> None:
+        super().__init__()
+
+        self.signals = TableItemDelegateSignals()
+
+        self._url_resolver = url_resolver
+
+        # (icon path, state, device pixel ratio) -> ready to draw icon
+        self._icon_cache: Dict[Tuple[str, str, float], QIcon] = {}
+
+        self.state_to_color = {
+            "normal": QColor.fromRgb(200, 200, 200),
+            "hover": QColor.fromRgb(255, 255, 255),
+            "selected": QColor.fromRgb(50, 50, 50)
+        }
+
+        self._decoration_size = QSize(self.ICON_SIZE, self.ICON_SIZE)
+
+        self._menu = menu
+
+    def editorEvent(self, event: QEvent, model: QAbstractItemModel, option: QStyleOptionViewItem, index: QModelIndex) -> bool:
+        if event.type() == QEvent.MouseButtonRelease:
+
+            mouse_event: QMouseEvent = event
+
+            if mouse_event.button() == Qt.LeftButton:
+
+                word: str = index.sibling(index.row(), 0).data(Qt.DisplayRole)
+
+                if index.column() == 2:
+
+                    trace = tracer.begin()
+                    url = self._url_resolver.resolve(word)
+                    trace.mark("resolved", url)
+                    self.signals.selected.emit(
+                        url, mouse_event.globalX(), mouse_event.globalY(), trace)
+
+                elif index.column() == 3:
+                    history: WordHistory = model
+                    # the view may show the history through a search proxy
+                    if isinstance(model, QAbstractProxyModel):
+                        history = model.sourceModel()
+                    history.remove_word(word)
+            elif mouse_event.button() == Qt.RightButton:
+                self._menu.exec_(mouse_event.globalPos())
+
+        return super().editorEvent(event, model, option, index)
+
+    def _get_icon(self, icon_path: str, flag: QStyle.StateFlag, dpr: float) -> QIcon:
+
+        # determine state
+        state = "normal"
+        if flag & QStyle.State_MouseOver:
+            state = "hover"
+        elif flag & QStyle.State_Selected:
+            state = "selected"
+
+        key = (icon_path, state, dpr)
+        icon = self._icon_cache.get(key)
+
+        if icon is not None:
+            return icon
+
+        # cache miss
+
+        # render the svg at the screen's resolution
+        size = int(self.ICON_SIZE * dpr)
+        pixmap = QIcon(icon_path).pixmap(size, size)
+
+        # fill icon with desired color
+        mask = pixmap.createMaskFromColor(QColor('black'), Qt.MaskOutColor)
+
+        pixmap.fill(self.state_to_color[state])
+        pixmap.setMask(mask)
+        pixmap.setDevicePixelRatio(dpr)
+
+        icon = QIcon(pixmap)
+        self._icon_cache[key] = icon
+
+        return icon
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
+        icon_path = WordHistory.ICON_COLUMNS.get(index.column())
+
+        if icon_path is None:
+            return super().paint(painter, option, index)
+
+        # The icon columns only need the row color from the model, so
+        # initStyleOption, which asks the model for every role, is skipped.
+        # Copying the option is a single call into Qt, cheaper than
+        # refilling a reused one field by field from Python.
+        opt = QStyleOptionViewItem(option)
+        opt.icon = self._get_icon(
+            icon_path, option.state, painter.device().devicePixelRatioF())
+        opt.decorationSize = self._decoration_size
+        opt.features = QStyleOptionViewItem.HasDecoration
+
+        background = index.data(Qt.BackgroundRole)
+        if background is not None:
+            opt.backgroundBrush = QBrush(background)
+
+        widget = option.widget
+        widget.style().drawControl(QStyle.CE_ItemViewItem, opt, painter, widget)
@@ -0,0 +1,28 @@
+import os
+
+from lookup_event_log import LookupEventLog
+
+
+def test_names_with_line_breaks_survive_a_reopen(tmp_path):
+    prefix = os.path.join(tmp_path, "lookups")
+    words = ["foo", "a\rb", "c\r\nd", "e\nf", "g h", "i\x85j", "qux"]
+
+    log = LookupEventLog(prefix)
+    for i, word in enumerate(words):
+        log.record(word, "source\r", timestamp=1000 + i)
+    log.close()
+
+    log = LookupEventLog(prefix)
+    assert len(log) == len(words)
+    for i, word in enumerate(words):
+        assert log.last_seen(word) == 1000 + i
+    assert log.scores() == {LookupEventLog._name(word): 1.0 for word in words}
+
+    # ids handed out after the reopen follow on from the stored names
+    log.record("new", timestamp=2000)
+    log.close()
+
+    log = LookupEventLog(prefix)
+    assert log.last_seen("new") == 2000
+    assert log.last_seen("qux") == 1006
+    log.close()
@@ -3,13 +3,52 @@ import json
 import re
 import shutil
 import os
+from threading import Thread
+
+try:
+    # unlike re, the regex module can give up on a match after a timeout
+    import regex
+except ImportError:
+    regex = None
+
+import regex_profiler
+from local_dictionary import local_url
+from match_worker import MatchTimeout, MatchWorker
+from persistence_service import persistence
+
+# source types, the third element of a dict_sources.json entry
+WEB = "web"
+LOCAL = "local"
+
+# longer selections are not looked up, which also bounds the cost of a match
+MAX_WORD_LENGTH = 256
+# seconds a single match of a pattern not timed yet may take
+MATCH_TIMEOUT = 0.05
+# seconds a match that ran past MATCH_TIMEOUT gets to show it is really slow
+CONFIRM_TIMEOUT = 1.0
+# words sent to the match worker at once
+MATCH_BATCH = 1024
 
 
 class UrlResolver:
 
-    def __init__(self) -> None:
+    def __init__(self, source_data: Optional[List[List[str]]] = None) -> None:
+        """Resolve with `source_data`, or with dict_sources.json if not given."""
         super().__init__()
-        self.load_data()
+        # patterns found to backtrack catastrophically, skipped until restart
+        self.quarantined: Set[str] = set()
+        # pattern -> worst time per match measured by regex_profiler, None if it timed out
+        self.costs: Dict[str, Optional[float]] = {}
+
+        # re cannot give up on a match, so without the regex module patterns
+        # not timed yet are matched in a process that can be killed
+        self._worker = MatchWorker(MATCH_TIMEOUT) if regex is None else None
+
+        if source_data is None:
+            self.load_data()
+        else:
+            self.source_data = source_data
+            self.rebuild()
 
     def load_data(self):
         if not os.path.exists("dict_sources.json"):
@@ -18,14 +57,174 @@ class UrlResolver:
         with open("dict_sources.json", 'r', encoding='utf-8') as f:
             self.source_data = json.load(f)
 
+        # entries written before local sources existed are web sources
+        for source in self.source_data:
+            if len(source) < 3:
+                source.append(WEB)
+
+        self.rebuild()
+
+        # the file may have been edited by hand, time its patterns once
+        Thread(target=self._check_patterns, daemon=True).start()
+
     def save_data(self):
-        with open("dict_sources.json", 'w', encoding='utf-8') as f:
-            json.dump(self.source_data, f)
+        persistence.schedule("dict_sources.json", json.dumps(self.source_data))
+
+    def rebuild(self):
+        """Recompile `source_data`, call this after editing it."""
+        # swapped in one assignment so a lookup on another thread
+        # never sees a half built dispatcher
+        active = [source for source in self.source_data if source[0] not in self.quarantined]
+        patterns = [source[0] for source in active]
+        # the cap on the word length and the profiler bound the cost of timed patterns
+        guarded = self._worker is not None and any(pattern not in self.costs for pattern in patterns)
+        self._dispatcher = self._compile(active) + (patterns, guarded)
+
+    def quarantine(self, pattern: str):
+        print(f"pattern {pattern!r} is too slow to match, its source is disabled")
+        self.quarantined.add(pattern)
+        self.rebuild()
+
+    def _check_patterns(self):
+        patterns = [source[0] for source in self.source_data]
+        try:
+            costs = regex_profiler.profile(patterns)
+        except (OSError, ValueError) as e:
+            print(f"cannot time the source patterns: {e}")
+            return
+
+        self.costs.update(zip(patterns, costs))
+        for pattern, cost in zip(patterns, costs):
+            if cost is None or cost > regex_profiler.REJECT_SECS:
+                self.quarantine(pattern)
+
+        # match in this process from now on
+        self.rebuild()
+
+    @staticmethod
+    def _compile(source_data: List[List[str]]):
+        engine = regex if regex is not None else re
+        compiled = [(engine.compile(pattern), (url, source_type))
+                    for pattern, url, source_type in source_data]
+
+        # Alternation tries its branches in order, so the first branch
+        # that matches at the start of the word is the first source
+        # re.match would have picked. Patterns with their own groups
+        # could have their backreferences renumbered, and patterns with
+        # global flags cannot be embedded; those fall back to the list.
+        if len(compiled) > 0 and all(p.groups == 0 for p, _ in compiled):
+            try:
+                combined = engine.compile("|".join(
+                    f"(?P<s{i}>{p.pattern})" for i, (p, _) in enumerate(compiled)))
+                return combined, compiled
+            except engine.error:
+                pass
+
+        return None, compiled
+
+    @staticmethod
+    def _match(pattern, word: str):
+        """pattern.match(word), raises TimeoutError after MATCH_TIMEOUT with the regex module."""
+        if regex is not None:
+            return pattern.match(word, timeout=MATCH_TIMEOUT)
+        return pattern.match(word)
 
     def resolve(self, word: str) -> Optional[str]:
+        if len(word) > MAX_WORD_LENGTH:
+            return None
+
+        combined, table, _, guarded = self._dispatcher
+
+        if combined is not None and regex is None and not guarded:
+            # the common case, one match of the combined regex
+            m = combined.match(word)
+            return self._format(table[m.lastindex - 1][1], word) if m is not None else None
+
+        if guarded:
+            targets = self._targets_in_worker([word], first=True)[0]
+        else:
+            targets = self._targets_here(word, first=True)
+
+        return self._format(targets[0], word) if len(targets) > 0 else None
+
+    def resolve_batch(self, words: List[str]) -> List[Optional[str]]:
+        """The url of each word, much cheaper than resolving them one by one."""
+        urls = []
+        for start in range(0, len(words), MATCH_BATCH):
+            batch = words[start:start + MATCH_BATCH]
+            for word, targets in zip(batch, self._targets(batch, first=True)):
+                urls.append(self._format(targets[0], word) if len(targets) > 0 else None)
+        return urls
+
+    def resolve_all(self, word: str) -> List[str]:
+        """Urls of every source matching `word`, in source order."""
+        urls = []
+
+        for target in self._targets([word], first=False)[0]:
+            url = self._format(target, word)
+            if url not in urls:
+                urls.append(url)
+
+        return urls
+
+    def _targets(self, words: List[str], first: bool) -> List[List[Tuple[str, str]]]:
+        """(url, source type) of the sources matching each word, in source
+        order, only the first one if `first`."""
+        short = [word for word in words if len(word) <= MAX_WORD_LENGTH]
+        found = iter(self._targets_in_worker(short, first) if self._dispatcher[3]
+                     else [self._targets_here(word, first) for word in short])
+        return [next(found) if len(word) <= MAX_WORD_LENGTH else [] for word in words]
+
+    def _targets_in_worker(self, words: List[str], first: bool) -> List[List[Tuple[str, str]]]:
+        while True:
+            _, table, patterns, guarded = self._dispatcher
+            if not guarded:
+                # timed meanwhile
+                return [self._targets_here(word, first) for word in words]
+
+            try:
+                try:
+                    matched = self._worker.match(patterns, words, first)
+                except MatchTimeout:
+                    # the worker may only have been held up, a slow pattern stays slow
+                    matched = self._worker.match(patterns, words, first, timeout=CONFIRM_TIMEOUT)
+                return [[table[i][1] for i in indices] for indices in matched]
+            except MatchTimeout as e:
+                # and try again without it
+                self.quarantine(patterns[e.pattern])
+            except OSError as e:
+                print(f"{e}, matching without a timeout")
+                return [self._targets_here(word, first) for word in words]
+
+    def _targets_here(self, word: str, first: bool) -> List[Tuple[str, str]]:
+        combined, table, _, _ = self._dispatcher
+
+        if first and combined is not None:
+            try:
+                m = self._match(combined, word)
+                return [table[m.lastindex - 1][1]] if m is not None else []
+            except TimeoutError:
+                # find out which pattern is slow below
+                pass
+
+        targets = []
+        for pattern, target in table:
+            try:
+                if self._match(pattern, word) is None:
+                    continue
+            except TimeoutError:
+                self.quarantine(pattern.pattern)
+                continue
+
+            targets.append(target)
+            if first:
+                break
 
-        for pattern, url in self.source_data:
-            if re.match(pattern, word) is not None:
-                return url % word
+        return targets
 
-        return None
+    @staticmethod
+    def _format(target: Tuple[str, str], word: str) -> str:
+        url, source_type = target
+        if source_type == LOCAL:
+            return local_url(url, word)
+        return url % word
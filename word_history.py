@@ -1,63 +1,548 @@
 from typing import *
 import csv
+import heapq
+import html
+import io
+import itertools
+import os
+import re
+import time
+from threading import Thread
 
-from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt, QSize
+from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt, QSize, Signal
 from PySide2.QtGui import QColor
 
+from base_history_store import BaseHistoryStore
+from lookup_event_log import DAY, LookupEventLog
+from persistence_service import write_atomic
+from word_index import WordIndex
+
+
+# file formats of import_words / export_words, by file extension
+FORMATS = {".csv": "csv", ".tsv": "tsv", ".txt": "anki"}
+
+# "#key:value" lines at the top of an Anki text file
+_ANKI_HEADER = re.compile(r"#[a-z ]+:")
+
+# background color of a row, indexed by its (capped) lookup count
+_COUNT_COLORS = [
+    None,
+    QColor.fromRgb(83, 235, 52, 100),
+    QColor.fromRgb(159, 235, 52, 100),
+    QColor.fromRgb(235, 223, 52, 100),
+    QColor.fromRgb(235, 147, 52, 100),
+    QColor.fromRgb(235, 64, 52, 100),
+]
+
+# with recency coloring, a row looked up within _RECENCY_AGES[i] seconds
+# gets _COUNT_COLORS[5 - i], and older rows _COUNT_COLORS[1]
+_RECENCY_AGES = [DAY, 7 * DAY, 30 * DAY, 365 * DAY]
+
 
 class WordHistory(QAbstractTableModel):
 
+    # rows pulled from a paged store per fetchMore
+    PAGE_SIZE = 256
+
+    # words returned per search call, see search
+    SEARCH_PAGE = 64
+    # a search walks the rows while at least one in this many is expected to match
+    SEARCH_DENSITY = 256
+
+    # columns showing a constant icon, column -> icon path
+    ICON_COLUMNS = {
+        2: "icons/book-atlas.svg",
+        3: "icons/trash-can.svg"
+    }
+
+    # a sort worked out on a worker thread, see sort_by
+    _sorted = Signal(int, object)
+    _index_built = Signal(int, object)
+    # the search index is ready, searches from now on are complete pages
+    indexed = Signal()
+
     def __init__(self) -> None:
         super().__init__()
 
+        # word -> count, in row order
         self.history_data: Dict[str, int] = {}
-        print(self.history_data)
+
+        # row -> word and word -> row, so that every lookup is O(1)
+        self._words: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+        self._store: Optional[BaseHistoryStore] = None
+
+        # search index, built on a worker thread after the first search
+        self._index: Optional[WordIndex] = None
+        # changes to replay on the index being built, None if none is
+        self._index_changes: Optional[List[Tuple[bool, str]]] = None
+        # only the latest build_index is applied
+        self._index_generation = 0
+        self._index_built.connect(self._apply_index)
+
+        # paging position in a paged store
+        self._last_fetched_id = 0
+        self._fully_fetched = True
+
+        # every lookup with its time, for recency coloring and sorting
+        self._event_log: Optional[LookupEventLog] = None
+        self.color_by_recency = False
+
+        # only the latest sort_by is applied
+        self._sort_generation = 0
+        self._sorted.connect(self._apply_order)
+        # bumped whenever rows come or go, so a sort can tell it is still current
+        self._row_changes = 0
+        for signal in (self.rowsInserted, self.rowsRemoved, self.modelReset):
+            signal.connect(self._count_row_change)
+
+    def set_store(self, store: BaseHistoryStore):
+        """Persist every subsequent change through `store`.
+
+        A paged store is the source of truth: the model starts empty and
+        the view pulls rows in through `fetchMore`.
+        """
+        if store.paged:
+            self.set_rows([])
+        self._store = store
+        self._last_fetched_id = 0
+        self._fully_fetched = not store.paged
+
+    def set_event_log(self, event_log: LookupEventLog):
+        self._event_log = event_log
+
+    def set_color_by_recency(self, enabled: bool):
+        self.color_by_recency = enabled
+        if len(self._words) > 0:
+            self.dataChanged.emit(self.createIndex(0, 0),
+                                  self.createIndex(len(self._words) - 1, 3), [Qt.BackgroundRole])
+
+    def sort_by(self, order: str):
+        """Reorder the rows: "added" (first lookup first), "count" or "recency"
+        (most first). The order is worked out on a worker thread and applied
+        once it is done; rows added meanwhile, and later, go to the bottom."""
+        self._sort_generation += 1
+        generation = self._sort_generation
+        row_changes = self._row_changes
+        # history_data keeps the order words were first added in
+        words = list(self.history_data.keys())
+
+        def sort():
+            words_sorted = self._sorted_words(order, words)
+            rows = {word: row for row, word in enumerate(words_sorted)}
+            self._sorted.emit(generation, (row_changes, words_sorted, rows))
+
+        Thread(target=sort, daemon=True).start()
+
+    def _sorted_words(self, order: str, words: List[str]) -> List[str]:
+        # the model may change meanwhile, words removed since count as 0
+        if order == "count":
+            counts = self.history_data
+            return sorted(words, key=lambda word: counts.get(word, 0), reverse=True)
+        elif order == "recency" and self._event_log is not None:
+            last_seen = self._event_log.last_seen
+            return sorted(words, key=lambda word: last_seen(word) or 0, reverse=True)
+        return words
+
+    def _count_row_change(self, *args):
+        self._row_changes += 1
+
+    def _apply_order(self, generation: int, result: Tuple[int, List[str], Dict[str, int]]):
+        if generation != self._sort_generation:
+            return
+
+        row_changes, words, rows = result
+
+        # rows came or went while sorting, drop the removed ones and add the new ones at the bottom
+        if row_changes != self._row_changes:
+            words = [word for word in words if word in self._rows]
+            sorted_words = set(words)
+            words.extend(word for word in self._words if word not in sorted_words)
+            rows = {word: row for row, word in enumerate(words)}
+
+        self.beginResetModel()
+        self._words = words
+        self._rows = rows
+        self.endResetModel()
+
+    def _recency_color(self, word: str) -> Optional[QColor]:
+        last_seen = self._event_log.last_seen(word)
+        if not last_seen:
+            return None
+
+        age = time.time() - last_seen
+        for i, max_age in enumerate(_RECENCY_AGES):
+            if age < max_age:
+                return _COUNT_COLORS[5 - i]
+        return _COUNT_COLORS[1]
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        if parent.isValid():
+            return False
+        return not self._fully_fetched
+
+    def fetchMore(self, parent: QModelIndex):
+        if parent.isValid() or self._fully_fetched:
+            return
+
+        page = self._store.fetch(self._last_fetched_id, self.PAGE_SIZE)
+
+        if len(page) < self.PAGE_SIZE:
+            self._fully_fetched = True
+
+        if len(page) == 0:
+            return
+
+        self._last_fetched_id = page[-1][0]
+        page = [(word, count) for _, word, count in page
+                if word not in self._rows]
+
+        if len(page) == 0:
+            return
+
+        first = len(self._words)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        for word, count in page:
+            self._rows[word] = len(self._words)
+            self._words.append(word)
+            self.history_data[word] = count
+            self._index_word(word, True)
+        self.endInsertRows()
+
+    def set_rows(self, rows: Iterable[Tuple[str, int]]):
+        """Replace the whole history with `rows` in a single model reset."""
+        self.beginResetModel()
+        self.history_data = dict(rows)
+        self._words = list(self.history_data.keys())
+        self._rows = {word: row for row, word in enumerate(self._words)}
+        self._drop_index()
+        self.endResetModel()
 
     def load_data(self, path: str):
 
         self.beginResetModel()
         with open(path, 'r', encoding='utf-8') as f:
             for k, v in csv.reader(f):
+                if k not in self.history_data:
+                    self._rows[k] = len(self._words)
+                    self._words.append(k)
                 self.history_data[k] = int(v)
+        self._drop_index()
         self.endResetModel()
 
     def save_data(self, path):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self.history_data.items())
+        write_atomic(path, buffer.getvalue())
+
+    @staticmethod
+    def _format_of(path: str, fmt: Optional[str]) -> str:
+        if fmt is not None:
+            return fmt
+        return FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+    @staticmethod
+    def _read_words(f: TextIO, fmt: str) -> Iterator[Tuple[str, int]]:
+        if fmt == "anki":
+            # one note per line, the word is the front field (html); the
+            # file may start with "#key:value" header lines
+            lines = itertools.dropwhile(_ANKI_HEADER.match, f)
+            for row in csv.reader(lines, delimiter='\t'):
+                word = html.unescape(row[0]).strip() if len(row) > 0 else ""
+                if len(word) > 0:
+                    yield word, 1
+            return
+
+        delimiter = '\t' if fmt == "tsv" else ','
+        for row in csv.reader(f, delimiter=delimiter):
+            if len(row) == 0 or len(row[0]) == 0:
+                continue
+            try:
+                count = int(row[1]) if len(row) > 1 else 1
+            except ValueError:
+                count = 1
+            yield row[0], count
+
+    def import_words(self, path: str, fmt: Optional[str] = None) -> int:
+        """Merge the counts of a csv, tsv or Anki text file into the history.
+
+        The file is streamed once; the view gets a single insert for all new
+        words and a single dataChanged for the updated ones. Returns the
+        number of words read.
+        """
+        fmt = self._format_of(path, fmt)
+        read = 0
+
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            words = self._read_words(f, fmt)
+
+            # rows the view has not paged in yet live only in the store
+            if not self._fully_fetched:
+                counted = []
+                for word, count in words:
+                    counted.append((word, count))
+                    read += 1
+                self._store.merge_many(counted)
+                self.set_store(self._store)
+                return read
+
+            added: Dict[str, int] = {}
+
+            for word, count in words:
+                read += 1
+                added[word] = added.get(word, 0) + count
+
+        counts = dict(zip(added, self._add_lookups(list(added.items()))))
+        updated = [word for word in added if word in self.history_data]
+        new = [word for word in added if word not in self.history_data]
+
+        for word in updated:
+            self.history_data[word] = counts[word]
+
+        if len(updated) > 0:
+            rows = [self._rows[word] for word in updated]
+            self.dataChanged.emit(self.createIndex(min(rows), 0),
+                                  self.createIndex(max(rows), 3))
+
+        if len(new) > 0:
+            first = len(self._words)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            for word in new:
+                self._rows[word] = len(self._words)
+                self._words.append(word)
+                self.history_data[word] = counts[word]
+                self._index_word(word, True)
+            self.endInsertRows()
+
+        return read
+
+    def export_words(self, path: str, fmt: Optional[str] = None,
+                     urls_for: Optional[Callable[[List[str]], List[Optional[str]]]] = None):
+        """Write the whole history as csv, tsv or an Anki text import file.
+
+        For Anki the back of each note links to the dictionary page
+        `urls_for` gives for the word, called once with every word.
+        """
+        fmt = self._format_of(path, fmt)
+
+        if self._fully_fetched:
+            rows = self.history_data.items()
+        else:
+            rows = self._store.load()
+
         with open(path, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(self.history_data.items())
+            if fmt == "anki":
+                f.write("#separator:tab\n#html:true\n#tags column:3\n")
+                writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+                rows = list(rows)
+                words = [word for word, _ in rows]
+                urls = urls_for(words) if urls_for is not None else [None] * len(words)
+                for (word, count), url in zip(rows, urls):
+                    back = f'<a href="{html.escape(url)}">{html.escape(word)}</a>' if url else ""
+                    writer.writerow((html.escape(word, quote=False), back,
+                                     f"selection_dict lookups::{count}"))
+            else:
+                delimiter = '\t' if fmt == "tsv" else ','
+                csv.writer(f, delimiter=delimiter).writerows(rows)
+
+    def search(self, query: str, start=0, limit=SEARCH_PAGE) -> Tuple[List[str], Optional[int]]:
+        """Return up to `limit` words matching `query` (see WordIndex) from
+        row `start` on, in row order, and the row to continue the search
+        at, None once there are no more matches.
+
+        Matches of a paged store that are not fetched yet are looked up in
+        the store, and fetched up to the last one so that each has a row.
+        """
+        words, row = self._search_rows(query, start, limit)
+
+        if row is not None or self._fully_fetched:
+            return words, row
+
+        after_id = self._last_fetched_id
+        while len(words) < limit:
+            found = self._store.search(query, after_id, limit - len(words))
+            if len(found) == 0:
+                return words, None
+            after_id = found[-1][0]
+
+            # as in fetchMore, words the model has keep their row
+            new = [(word_id, word) for word_id, word, _ in found if word not in self._rows]
+            if len(new) > 0:
+                self._fetch_through(new[-1][0])
+                words.extend(word for _, word in new)
+
+        # the fetched pages may hold more matches after the last one
+        return words, self._rows[words[-1]] + 1
+
+    def _fetch_through(self, last_id: int):
+        while not self._fully_fetched and self._last_fetched_id < last_id:
+            self.fetchMore(QModelIndex())
+
+    def _search_rows(self, query: str, start: int, limit: int) -> Tuple[List[str], Optional[int]]:
+        if self._index is None:
+            if self._index_changes is None:
+                self.build_index()
+            # a page may come up short until then, see `indexed`
+            words, row = self._walk(query, start, limit,
+                                    min(len(self._words), start + limit * self.SEARCH_DENSITY))
+            return words, row if row < len(self._words) else None
+
+        words = []
+        row = start
+
+        # Common matches turn up quickly walking the rows. A walk that runs
+        # past its budget, or a rare query, sorts the index's matches instead.
+        if self._index.estimate(query) * self.SEARCH_DENSITY >= len(self._words) - start:
+            words, row = self._walk(query, start, limit,
+                                    min(len(self._words), start + limit * self.SEARCH_DENSITY))
+            if len(words) == limit:
+                return words, row
+            if row == len(self._words):
+                return words, None
+
+        rows = sorted(r for r in map(self._rows.__getitem__, self._index.search(query)) if r >= row)
+        found = rows[:limit - len(words)]
+        words.extend(map(self._words.__getitem__, found))
+
+        return words, rows[len(found)] if len(rows) > len(found) else None
+
+    def _walk(self, query: str, start: int, limit: int, end: int) -> Tuple[List[str], int]:
+        """Up to `limit` words matching `query` in rows `start` to `end`,
+        and the row after the last one looked at."""
+        folded = query.casefold()
+        match = str.startswith if len(folded) < WordIndex.GRAM else str.__contains__
+        words = []
+        row = start
+
+        while row < end:
+            word = self._words[row]
+            row += 1
+            if match(word.casefold(), folded):
+                words.append(word)
+                if len(words) == limit:
+                    break
+
+        return words, row
+
+    def build_index(self):
+        """Index the words for search on a worker thread, search walks the
+        rows until the index is handed over."""
+        self._index_generation += 1
+        generation = self._index_generation
+        words = list(self._words)
+        # changes from now on are replayed on it
+        self._index_changes = []
+        Thread(target=lambda: self._index_built.emit(generation, WordIndex(words)),
+               daemon=True).start()
+
+    def is_indexed(self) -> bool:
+        return self._index is not None
+
+    def _apply_index(self, generation: int, index: WordIndex):
+        if generation != self._index_generation:
+            return
+
+        for added, word in self._index_changes:
+            if added:
+                index.add(word)
+            else:
+                index.remove(word)
+
+        self._index_changes = None
+        self._index = index
+        self.indexed.emit()
+
+    def _drop_index(self):
+        # built again on the next search
+        self._index = None
+        self._index_changes = None
+        self._index_generation += 1
+
+    def _index_word(self, word: str, added: bool):
+        if self._index_changes is not None:
+            self._index_changes.append((added, word))
+        elif self._index is not None:
+            if added:
+                self._index.add(word)
+            else:
+                self._index.remove(word)
+
+    def word_at(self, row: int) -> str:
+        return self._words[row]
+
+    def row_of(self, word: str) -> Optional[int]:
+        return self._rows.get(word)
+
+    def top_words(self, n: int) -> List[str]:
+        """Return the `n` most looked-up words, most frequent first."""
+        if self._store is not None and self._store.paged:
+            return self._store.top(n)
+
+        items = heapq.nlargest(
+            n, self.history_data.items(), key=lambda item: item[1])
+        return [word for word, _ in items]
 
     def add_word(self, word: str):
-        try:
-            row = list(self.history_data.keys()).index(word)
-            idx = self.createIndex(row, 1)
-            self.history_data[word] += 1
+        row = self._rows.get(word)
+
+        if row is None and not self._fully_fetched:
+            # the word is (or will be) in a page the view has not pulled
+            # in yet, it shows up once the view scrolls that far
+            count = self._store.count_of(word) or 0
+            self._store.record(word, count + 1)
+        elif row is not None:
+            self.history_data[word] = self._add_lookups([(word, 1)])[0]
             self.dataChanged.emit(self.createIndex(
                 row, 0), self.createIndex(row, 3), [])
-
-        except ValueError:
-            self.beginInsertRows(QModelIndex(), len(
-                self.history_data), len(self.history_data))
-            self.history_data[word] = 1
+        else:
+            count = self._add_lookups([(word, 1)])[0]
+            row = len(self._words)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._words.append(word)
+            self._rows[word] = row
+            self.history_data[word] = count
+            self._index_word(word, True)
             self.endInsertRows()
 
-        print(self.history_data)
-
     def remove_word(self, word: str):
-        try:
-            row = list(self.history_data.keys()).index(word)
-            self.beginRemoveRows(QModelIndex(), row, row)
-            del self.history_data[word]
-            self.endRemoveRows()
-        except ValueError:
-            pass
+        row = self._rows.get(word)
+
+        if row is None:
+            return
+
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._words[row]
+        del self._rows[word]
+        del self.history_data[word]
+        # rows after the removed one shift up by one
+        for i in range(row, len(self._words)):
+            self._rows[self._words[i]] = i
+        self._index_word(word, False)
+        self.endRemoveRows()
+        self._record(word)
 
     def reset_count(self, row: int):
-        self.history_data[list(self.history_data.keys())[row]] = 1
+        self.history_data[self._words[row]] = 1
+        self._record(self._words[row])
         self.dataChanged.emit(self.createIndex(row, 0),
                               self.createIndex(row, 3))
 
+    def _record(self, word: str):
+        if self._store is not None:
+            self._store.record(word, self.history_data.get(word))
+
+    def _add_lookups(self, items: List[Tuple[str, int]]) -> List[int]:
+        """New counts of the words in (word, lookups added) `items`, persisted
+        through the store, which may know of lookups made elsewhere."""
+        counts = [self.history_data.get(word, 0) + added for word, added in items]
+        if self._store is None:
+            return counts
+        return self._store.add_lookups(
+            [(word, added, count) for (word, added), count in zip(items, counts)])
+
     def rowCount(self, parent: QModelIndex = ...) -> int:
-        return len(self.history_data)
+        return len(self._words)
 
     def columnCount(self, parent: QModelIndex = ...) -> int:
         return 4
@@ -70,30 +555,21 @@ class WordHistory(QAbstractTableModel):
         if role == Qt.DisplayRole:
 
             if col == 0:
-                return list(self.history_data.keys())[row]
+                return self._words[row]
             elif col == 1:
-                return self.history_data[list(self.history_data.keys())[row]]
-            elif col == 2:
-                return "icons/book-atlas.svg"
-            elif col == 3:
-                return "icons/trash-can.svg"
+                return self.history_data[self._words[row]]
+            elif col in self.ICON_COLUMNS:
+                return self.ICON_COLUMNS[col]
 
         elif role == Qt.BackgroundRole:
 
-            val = self.history_data[list(self.history_data.keys())[row]]
+            if self.color_by_recency and self._event_log is not None:
+                return self._recency_color(self._words[row])
 
-            a = 100
+            val = self.history_data[self._words[row]]
 
-            if val >= 5:
-                return QColor.fromRgb(235, 64, 52, a)
-            elif val == 4:
-                return QColor.fromRgb(235, 147, 52, a)
-            elif val == 3:
-                return QColor.fromRgb(235, 223, 52, a)
-            elif val == 2:
-                return QColor.fromRgb(159, 235, 52, a)
-            elif val == 1:
-                return QColor.fromRgb(83, 235, 52, a)
+            if val >= 1:
+                return _COUNT_COLORS[min(val, 5)]
 
         elif role == Qt.TextAlignmentRole:
             return Qt.AlignCenter
@@ -0,0 +1,102 @@
+from typing import *
+import bisect
+
+
+class WordIndex:
+    """Case-insensitive search index over the words of the history.
+
+    Queries shorter than three characters match word prefixes through a
+    sorted key list; longer queries match substrings through a trigram
+    index, and candidates are then checked against the full query.
+    """
+
+    GRAM = 3
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        # sorted (folded word, word) pairs
+        self._keys: List[Tuple[str, str]] = sorted(
+            (word.casefold(), word) for word in words)
+        # trigram -> words containing it
+        self._grams: Dict[str, Set[str]] = {}
+
+        for folded, word in self._keys:
+            for gram in self._grams_of(folded):
+                self._grams.setdefault(gram, set()).add(word)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def _grams_of(cls, folded: str) -> Set[str]:
+        return {folded[i:i + cls.GRAM] for i in range(len(folded) - cls.GRAM + 1)}
+
+    @classmethod
+    def matches(cls, query: str, word: str) -> bool:
+        """Whether `word` is a result of `query`, without using an index."""
+        query = query.casefold()
+        folded = word.casefold()
+        if len(query) < cls.GRAM:
+            return folded.startswith(query)
+        return query in folded
+
+    def estimate(self, query: str) -> int:
+        """An upper bound of the number of results of `query`, without collecting them."""
+        query = query.casefold()
+
+        if len(query) < self.GRAM:
+            lo, hi = self._prefix_range(query)
+            return hi - lo
+
+        return min(len(self._grams.get(gram, ())) for gram in self._grams_of(query))
+
+    def add(self, word: str):
+        folded = word.casefold()
+        bisect.insort(self._keys, (folded, word))
+        for gram in self._grams_of(folded):
+            self._grams.setdefault(gram, set()).add(word)
+
+    def remove(self, word: str):
+        folded = word.casefold()
+        i = bisect.bisect_left(self._keys, (folded, word))
+        if i < len(self._keys) and self._keys[i] == (folded, word):
+            del self._keys[i]
+
+        for gram in self._grams_of(folded):
+            words = self._grams.get(gram)
+            if words is not None:
+                words.discard(word)
+                if len(words) == 0:
+                    del self._grams[gram]
+
+    def search(self, query: str) -> Set[str]:
+        query = query.casefold()
+
+        if len(query) < self.GRAM:
+            return self._search_prefix(query)
+
+        # intersect the smallest posting sets first
+        postings = []
+        for gram in self._grams_of(query):
+            words = self._grams.get(gram)
+            if words is None:
+                return set()
+            postings.append(words)
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for words in postings[1:]:
+            candidates &= words
+            if len(candidates) == 0:
+                return candidates
+
+        # the query's trigrams may occur apart from each other
+        return {word for word in candidates if query in word.casefold()}
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        # keys starting with `prefix` sort between it and itself plus the last code point
+        return (bisect.bisect_left(self._keys, (prefix, "")),
+                bisect.bisect_left(self._keys, (prefix + "\U0010ffff", "")))
+
+    def _search_prefix(self, prefix: str) -> Set[str]:
+        lo, hi = self._prefix_range(prefix)
+        return {word for _, word in self._keys[lo:hi]}
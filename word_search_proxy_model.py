@@ -0,0 +1,244 @@
+from typing import *
+
+from PySide2.QtCore import *
+
+from word_history import WordHistory
+from word_index import WordIndex
+
+
+class WordSearchProxyModel(QAbstractProxyModel):
+    """Filters a WordHistory down to the words matching a search query.
+
+    QSortFilterProxyModel re-runs filterAcceptsRow for every source row on
+    each change of the filter, one Python call per row. This proxy asks the
+    history for the first page of matching words in source order instead
+    (see WordHistory.search) and fetches the next page as the view scrolls
+    down, so a keystroke costs about one page of results.
+    Without a query every source row passes through unchanged.
+    """
+
+    # dataChanged ranges longer than this are forwarded as a whole
+    MAX_MAPPED_CHANGES = 64
+
+    def __init__(self, source: WordHistory) -> None:
+        super().__init__()
+        self._query = ""
+        # matching words in source order, None while there is no query
+        self._words: Optional[List[str]] = None
+        self._rows: Dict[str, int] = {}
+        # source row the search continues at, None once every match is in _words
+        self._next_row: Optional[int] = None
+        # a search may fetch rows of a paged store, those are its results
+        self._searching = False
+
+        self.setSourceModel(source)
+
+        source.dataChanged.connect(self._handle_data_changed)
+        source.rowsAboutToBeInserted.connect(self._handle_rows_about_to_be_inserted)
+        source.rowsInserted.connect(self._handle_rows_inserted)
+        source.rowsAboutToBeRemoved.connect(self._handle_rows_about_to_be_removed)
+        source.rowsRemoved.connect(self._handle_rows_removed)
+        source.modelAboutToBeReset.connect(self.beginResetModel)
+        source.modelReset.connect(self._handle_model_reset)
+        source.indexed.connect(self._handle_indexed)
+
+    def set_query(self, query: str):
+        query = query.strip()
+
+        if query == self._query:
+            return
+
+        self.beginResetModel()
+        self._query = query
+        self._apply_query()
+        self.endResetModel()
+
+    def _apply_query(self):
+        if len(self._query) == 0:
+            self._words = None
+            self._rows = {}
+            self._next_row = None
+            return
+
+        self._words, self._next_row = self._search(0)
+        self._rows = {word: row for row, word in enumerate(self._words)}
+
+    # QAbstractItemModel
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        if self._words is None:
+            return self.sourceModel().rowCount()
+        return len(self._words)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return self.sourceModel().columnCount()
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if parent.isValid() or not (0 <= row < self.rowCount()) or not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+        return QModelIndex()
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        if parent.isValid():
+            return False
+        if self._words is not None and self._next_row is not None:
+            return True
+        return self.sourceModel().canFetchMore(QModelIndex())
+
+    def fetchMore(self, parent: QModelIndex):
+        if parent.isValid():
+            return
+
+        if self._words is None or self._next_row is None:
+            self.sourceModel().fetchMore(QModelIndex())
+            return
+
+        words, self._next_row = self._search(self._next_row)
+
+        if len(words) == 0:
+            return
+
+        start = len(self._words)
+        self.beginInsertRows(QModelIndex(), start, start + len(words) - 1)
+        for word in words:
+            self._rows[word] = len(self._words)
+            self._words.append(word)
+        self.endInsertRows()
+
+    def _search(self, start: int) -> Tuple[List[str], Optional[int]]:
+        self._searching = True
+        try:
+            return self.sourceModel().search(self._query, start)
+        finally:
+            self._searching = False
+
+    def mapToSource(self, proxy_index: QModelIndex) -> QModelIndex:
+        if not proxy_index.isValid():
+            return QModelIndex()
+
+        row = proxy_index.row()
+        if self._words is not None:
+            if row >= len(self._words):
+                return QModelIndex()
+            row = self.sourceModel().row_of(self._words[row])
+            if row is None:
+                return QModelIndex()
+
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index: QModelIndex) -> QModelIndex:
+        if not source_index.isValid():
+            return QModelIndex()
+
+        row = source_index.row()
+        if self._words is not None:
+            row = self._rows.get(self.sourceModel().word_at(row))
+            if row is None:
+                return QModelIndex()
+
+        return self.createIndex(row, source_index.column())
+
+    # source signals
+
+    def _handle_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles=[]):
+        if self._words is None:
+            self.dataChanged.emit(self.createIndex(top_left.row(), top_left.column()),
+                                  self.createIndex(bottom_right.row(), bottom_right.column()), roles)
+            return
+
+        if len(self._words) == 0:
+            return
+
+        last_col = self.columnCount() - 1
+
+        if bottom_right.row() - top_left.row() >= self.MAX_MAPPED_CHANGES:
+            self.dataChanged.emit(self.createIndex(0, 0),
+                                  self.createIndex(len(self._words) - 1, last_col), roles)
+            return
+
+        for source_row in range(top_left.row(), bottom_right.row() + 1):
+            row = self._rows.get(self.sourceModel().word_at(source_row))
+            if row is not None:
+                self.dataChanged.emit(self.createIndex(row, 0),
+                                      self.createIndex(row, last_col), roles)
+
+    def _handle_rows_about_to_be_inserted(self, parent: QModelIndex, first: int, last: int):
+        if self._words is None and not self._searching:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _handle_rows_inserted(self, parent: QModelIndex, first: int, last: int):
+        if self._searching:
+            return
+
+        if self._words is None:
+            self.endInsertRows()
+            return
+
+        source: WordHistory = self.sourceModel()
+
+        # rows inserted in the middle would shift the order, start over
+        if last != source.rowCount() - 1:
+            self.beginResetModel()
+            self._apply_query()
+            self.endResetModel()
+            return
+
+        # the search has yet to get that far, fetchMore picks them up
+        if self._next_row is not None:
+            return
+
+        new = [source.word_at(row) for row in range(first, last + 1)
+               if WordIndex.matches(self._query, source.word_at(row))]
+
+        if len(new) == 0:
+            return
+
+        start = len(self._words)
+        self.beginInsertRows(QModelIndex(), start, start + len(new) - 1)
+        for word in new:
+            self._rows[word] = len(self._words)
+            self._words.append(word)
+        self.endInsertRows()
+
+    def _handle_rows_about_to_be_removed(self, parent: QModelIndex, first: int, last: int):
+        if self._words is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            return
+
+        source: WordHistory = self.sourceModel()
+        rows = [self._rows[source.word_at(source_row)] for source_row in range(first, last + 1)
+                if source.word_at(source_row) in self._rows]
+
+        if self._next_row is not None and first < self._next_row:
+            self._next_row -= min(last + 1, self._next_row) - first
+
+        # remove from the bottom up so the remaining rows stay valid
+        for row in sorted(rows, reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[self._words[row]]
+            del self._words[row]
+            self.endRemoveRows()
+
+        for row in range(min(rows, default=len(self._words)), len(self._words)):
+            self._rows[self._words[row]] = row
+
+    def _handle_rows_removed(self, parent: QModelIndex, first: int, last: int):
+        if self._words is None:
+            self.endRemoveRows()
+
+    def _handle_indexed(self):
+        # a page found before the index may have come up short, and a short
+        # page does not make the view fetch the next one
+        if self._words is not None and self._next_row is not None:
+            self.beginResetModel()
+            self._apply_query()
+            self.endResetModel()
+
+    def _handle_model_reset(self):
+        self._apply_query()
+        self.endResetModel()